@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Benchmark image-to-image input preprocessing:
+full decode + LANCZOS resize + PNG encode on every attempt (old) vs prepare_image once
+
+Usage:
+    python benchmark_preprocess.py
+    python benchmark_preprocess.py --runs 20 --attempts 3 --source-size 6000x4000
+    python benchmark_preprocess.py --format WEBP --resample bilinear
+"""
+
+import argparse
+import base64
+import io
+import statistics
+import time
+from PIL import Image
+from services.image_preprocess import prepare_image, RESAMPLE_FILTERS
+
+TARGETS = {
+    "thumbnail": (1280, 720),
+    "poster": (1080, 1920),
+}
+
+
+def make_source(size, fmt: str) -> bytes:
+    """Photo-like test image: gradients with noise, so encoders cannot cheat"""
+    gradient = Image.linear_gradient("L").resize(size)
+    noise = Image.effect_noise(size, 40)
+    img = Image.merge("RGB", (gradient, noise, gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT)))
+    buffer = io.BytesIO()
+    img.save(buffer, format=fmt, **({"quality": 92} if fmt == "JPEG" else {}))
+    return buffer.getvalue()
+
+
+def old_pipeline(b64_string: str, size) -> bytes:
+    """What generate_images_from_image did on every attempt"""
+    img = Image.open(io.BytesIO(base64.b64decode(b64_string)))
+    img = img.resize(size, Image.Resampling.LANCZOS)
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def timed(fn, runs: int):
+    samples = []
+    output = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        output = fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples, output
+
+
+def report(name: str, samples, output_bytes: int):
+    print(f"   {name:40s} p50 {statistics.median(samples):8.1f} ms   "
+          f"max {max(samples):8.1f} ms   sent {output_bytes / 1024:8.0f} KB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--attempts", type=int, default=1, help="model attempts per request (old code preprocessed on each)")
+    parser.add_argument("--source-size", default="4000x3000")
+    parser.add_argument("--format", default="JPEG", choices=["JPEG", "WEBP", "PNG"])
+    parser.add_argument("--quality", type=int, default=90)
+    parser.add_argument("--resample", default="lanczos", choices=sorted(RESAMPLE_FILTERS))
+    args = parser.parse_args()
+
+    source_size = tuple(int(x) for x in args.source_size.lower().split("x"))
+
+    print("=" * 78)
+    print("⏱️  IMAGE PREPROCESSING BENCHMARK")
+    print("=" * 78)
+
+    for source_format in ("JPEG", "PNG"):
+        source = make_source(source_size, source_format)
+        b64_string = base64.b64encode(source).decode()
+        for name, target in TARGETS.items():
+            print(f"\n📊 {source_format} {source_size[0]}×{source_size[1]} "
+                  f"({len(source) / 1024:.0f} KB) → {name} {target[0]}×{target[1]}, "
+                  f"{args.attempts} attempt(s):")
+            old_samples, old_output = timed(
+                lambda: [old_pipeline(b64_string, target) for _ in range(args.attempts)][-1], args.runs
+            )
+            new_samples, new_output = timed(
+                lambda: prepare_image(base64.b64decode(b64_string), target, args.resample, args.format, args.quality),
+                args.runs
+            )
+            report("decode + LANCZOS + PNG per attempt", old_samples, len(old_output))
+            report(f"prepare_image ({args.resample}, {args.format} q{args.quality})", new_samples, len(new_output[0]))
+            print(f"   speed-up: {statistics.median(old_samples) / statistics.median(new_samples):.1f}×")
+
+    # Inputs that already have the target size are passed through untouched
+    source = make_source(TARGETS["thumbnail"], "JPEG")
+    samples, output = timed(lambda: prepare_image(source, TARGETS["thumbnail"]), args.runs)
+    print("\n📊 JPEG already at thumbnail size:")
+    report("prepare_image (original bytes reused)", samples, len(output[0]))
+
+
+if __name__ == "__main__":
+    main()
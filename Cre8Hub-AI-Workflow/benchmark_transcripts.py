@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Benchmark transcript loading for persona extraction:
+KEYS + per-key GET (old) vs SCAN + pipelined MGET
+
+Usage:
+    python benchmark_transcripts.py                 # local Redis on REDIS_HOST/REDIS_PORT
+    python benchmark_transcripts.py --fake          # in-process fakeredis
+    python benchmark_transcripts.py --users 1000 --per-user 50
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import time
+import redis.asyncio as aioredis
+from services.transcripts import TranscriptStore, transcript_key
+
+BODY = "lorem ipsum dolor sit amet " * 10
+
+
+async def populate(client, users: int, per_user: int):
+    print(f"📦 Writing {users} users × {per_user} transcripts...")
+    start = time.perf_counter()
+    pipe = client.pipeline(transaction=False)
+    for u in range(users):
+        user_id = f"bench-user{u}"
+        for v in range(per_user):
+            pipe.set(transcript_key(user_id, f"video{v}"), BODY)
+        if u % 50 == 49:
+            await pipe.execute()
+    await pipe.execute()
+    print(f"   done in {time.perf_counter() - start:.1f}s")
+
+
+async def load_with_keys(client, user_id: str) -> int:
+    """The original persona.py access pattern"""
+    keys = await client.keys(f"transcript:{user_id}:*")
+    loaded = 0
+    for key in keys:
+        if await client.get(key):
+            loaded += 1
+    return loaded
+
+
+async def load_with_store(store: TranscriptStore, user_id: str) -> int:
+    return len(await store.fetch(user_id, await store.list_video_ids(user_id)))
+
+
+async def timed(fn, users):
+    samples = []
+    for user_id in users:
+        start = time.perf_counter()
+        await fn(user_id)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def report(name: str, samples):
+    print(f"   {name:28s} p50 {statistics.median(samples):8.1f} ms   "
+          f"max {max(samples):8.1f} ms   total {sum(samples):9.1f} ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fake", action="store_true", help="use fakeredis instead of a Redis server")
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--per-user", type=int, default=200)
+    parser.add_argument("--samples", type=int, default=20, help="users to time per strategy")
+    args = parser.parse_args()
+
+    if args.fake:
+        import fakeredis
+        client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    else:
+        client = aioredis.Redis(
+            host=os.getenv("REDIS_HOST", "127.0.0.1"),
+            port=int(os.getenv("REDIS_PORT", 6379)),
+            password=os.getenv("REDIS_PASSWORD", None),
+            decode_responses=True
+        )
+
+    print("=" * 70)
+    print("⏱️  TRANSCRIPT LOADING BENCHMARK")
+    print("=" * 70)
+
+    await populate(client, args.users, args.per_user)
+    scan_users = [f"bench-user{u}" for u in range(args.users)][:args.samples]
+
+    store = TranscriptStore(client)
+    print(f"\n📊 {len(scan_users)} users, {args.per_user} transcripts each, {await client.dbsize()} keys in Redis:")
+    report("KEYS + GET per key", await timed(lambda u: load_with_keys(client, u), scan_users))
+    report("SCAN + pipelined MGET", await timed(lambda u: load_with_store(store, u), scan_users))
+
+    print("\n💡 KEYS blocks the whole server for its full duration; SCAN only holds it for")
+    print("   one bounded step at a time.")
+    if args.fake:
+        print("   fakeredis walks every key on each SCAN step, so SCAN totals here are far")
+        print("   worse than on a real Redis server.")
+
+    print("\n🧹 Cleaning up benchmark keys...")
+    for pattern in ("transcript:bench-user*",):
+        batch = []
+        async for key in client.scan_iter(match=pattern, count=1000):
+            batch.append(key)
+            if len(batch) >= 1000:
+                await client.unlink(*batch)
+                batch = []
+        if batch:
+            await client.unlink(*batch)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,14 +1,26 @@
-from fastapi import FastAPI, HTTPException, File, UploadFile, Form
+from fastapi import FastAPI, HTTPException, File, UploadFile, Form, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse, FileResponse, JSONResponse
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Optional, List, Union, BinaryIO, Callable, Awaitable
 import os
 import base64
 import io
+import json
 from PIL import Image, ImageDraw
 import google.generativeai as genai
 from dotenv import load_dotenv
 import asyncio
+import uuid
+from functools import lru_cache
+from services.executors import BoundedExecutor
+from services.blob_store import get_blob_store
+from services.image_preprocess import prepare_image
+from services.rate_limiter import get_rate_limiter, estimate_tokens, is_rate_limit_error, is_quota_error
+from services.key_pool import get_key_pool
+from services.model_registry import ModelRegistry
+from services.generation_cache import GenerationCache, generation_key
+from services.jobs import JobQueue, QueueFull, create_job_store
 
 load_dotenv()
 
@@ -30,21 +42,80 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Get API Key
+# Get API Keys - GOOGLE_API_KEYS (comma-separated) spreads load over several keys
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
-if not GOOGLE_API_KEY:
+if not GOOGLE_API_KEY and not os.getenv("GOOGLE_API_KEYS"):
     raise ValueError("❌ GOOGLE_API_KEY not set! Export it in your environment.")
 
 # Configure Google AI
-genai.configure(api_key=GOOGLE_API_KEY)
-print(f"✅ Google AI configured with API key")
+key_pool = get_key_pool()
+genai.configure(api_key=key_pool.keys[0].key)
+print(f"✅ Google AI configured with {len(key_pool.keys)} API key(s)")
+
+# generate_content blocks for several seconds, so image calls run on a dedicated
+# pool; at most CANVAS_MAX_IN_FLIGHT run at once and the rest queue on the event loop
+CANVAS_MAX_IN_FLIGHT = int(os.getenv("CANVAS_MAX_IN_FLIGHT", "4"))
+image_executor = BoundedExecutor("image-generation", CANVAS_MAX_IN_FLIGHT)
+
+# Input images are decoded, resized and re-encoded once per request on their own pool,
+# so CPU-heavy preprocessing never takes a slot from the model calls
+PREPROCESS_WORKERS = int(os.getenv("PREPROCESS_WORKERS", str(min(4, os.cpu_count() or 1))))
+preprocess_executor = BoundedExecutor("image-preprocess", PREPROCESS_WORKERS)
+
+# Upper bound on num_images for one text-to-image request
+MAX_IMAGES_PER_REQUEST = int(os.getenv("MAX_IMAGES_PER_REQUEST", "8"))
+
+# Upload limits, checked before any pixel data is decoded
+MAX_UPLOAD_MB = float(os.getenv("MAX_UPLOAD_MB", "20"))
+MAX_UPLOAD_BYTES = int(MAX_UPLOAD_MB * 1024 * 1024)
+MAX_IMAGE_PIXELS = int(os.getenv("MAX_IMAGE_PIXELS", "40000000"))
+MAX_REFERENCE_IMAGES = 3
+Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+
+IMAGE_MODEL = os.getenv("CANVAS_IMAGE_MODEL", "gemini-2.5-flash-image")
+
+# Shared per-model, per-key request budget (see RATE_LIMIT_SOLUTIONS.md)
+rate_limiter = get_rate_limiter()
+
+# One model instance and client per API key, built at startup and reused by every call
+model_registry = ModelRegistry(key_pool, [IMAGE_MODEL], rate_limiter=rate_limiter)
+# Also make one count_tokens call per key at startup to open connections early
+MODEL_WARMUP_PROBE = os.getenv("MODEL_WARMUP_PROBE", "false").lower() == "true"
+
+# Rendered error tiles kept in memory, keyed by (width, height, error class)
+PLACEHOLDER_CACHE_SIZE = int(os.getenv("PLACEHOLDER_CACHE_SIZE", "32"))
+
+# Generated images are kept on disk and served from /images/{id} in "url" mode
+blob_store = get_blob_store()
+
+# Identical generations (same model, final prompt, type, inputs and slot) are served from
+# disk for GENERATION_CACHE_TTL, and concurrent identical requests share one API call
+generation_cache = GenerationCache(blob_store)
+
+# Job mode: requests are queued and processed by JOB_WORKERS background tasks, and
+# clients poll /jobs/{id} or subscribe to /jobs/{id}/events instead of holding a connection
+job_queue = JobQueue(create_job_store())
 
 # --------------- MODELS ----------------
+# "json": base64 data URLs in GenerationResponse.images (default)
+# "url": images stored in the blob store, GenerationResponse.images holds /images/{id} paths
+# "binary": raw bytes with the image content type (multipart/mixed for several images)
+# "multipart": always multipart/mixed, one part per image
+RESPONSE_MODES = ("json", "url", "binary", "multipart")
+
+# How a failed text-to-image result is reported:
+# "placeholder": an error tile in its place in images (default)
+# "descriptor": left out of images and described in GenerationResponse.errors
+ERROR_MODES = ("placeholder", "descriptor")
+
 class TextToImageRequest(BaseModel):
     prompt: str
     generation_type: str  # "thumbnail", "advertisement", "poster"
     negative_prompt: Optional[str] = None
     num_images: Optional[int] = 1
+    response_mode: Optional[str] = "json"
+    error_mode: Optional[str] = "placeholder"
+    use_cache: Optional[bool] = True  # False forces fresh images
 
 class ImageToImageRequest(BaseModel):
     prompt: str
@@ -53,6 +124,8 @@ class ImageToImageRequest(BaseModel):
     reference_images: Optional[List[str]] = []
     negative_prompt: Optional[str] = None
     strength: Optional[float] = 0.75
+    response_mode: Optional[str] = "json"
+    use_cache: Optional[bool] = True
 
 class GenerationResponse(BaseModel):
     success: bool
@@ -60,6 +133,7 @@ class GenerationResponse(BaseModel):
     prompt_used: str
     generation_type: str
     message: Optional[str] = None
+    errors: Optional[List[dict]] = None
 
 # --------------- HELPERS ----------------
 DIMENSIONS = {
@@ -79,27 +153,94 @@ def enhance_prompt(prompt: str, gen_type: str) -> str:
     enhancement = ENHANCEMENTS.get(gen_type, "")
     return f"{enhancement}{prompt}. Professional quality, highly detailed, sharp focus."
 
-def decode_image(b64_string: str) -> Image.Image:
-    """Decode base64 to PIL Image"""
-    if "," in b64_string:
-        b64_string = b64_string.split(",")[1]
-    return Image.open(io.BytesIO(base64.b64decode(b64_string)))
+class GeneratedImage:
+    """Raw image bytes and their MIME type; only base64-encoded if the response needs it"""
+
+    __slots__ = ("data", "mime_type")
+
+    def __init__(self, data: bytes, mime_type: str = "image/png"):
+        self.data = data
+        self.mime_type = mime_type
+
+    def data_url(self) -> str:
+        return f"data:{self.mime_type};base64,{base64.b64encode(self.data).decode()}"
+
+def open_upload(upload: UploadFile, label: str) -> BinaryIO:
+    """
+    Validate an uploaded image without decoding it. The upload is already spooled
+    to a temp file; only the header is read here, pixels are decoded by prepare_image.
+    """
+    upload.file.seek(0, os.SEEK_END)
+    size = upload.file.tell()
+    upload.file.seek(0)
+    if size > MAX_UPLOAD_BYTES:
+        raise HTTPException(413, f"{label} is larger than {MAX_UPLOAD_MB:.0f} MB")
+    try:
+        img = Image.open(upload.file)
+    except Exception:
+        raise HTTPException(400, f"{label} is not a supported image")
+    if img.width * img.height > MAX_IMAGE_PIXELS:
+        raise HTTPException(413, f"{label} is {img.width}×{img.height}; the limit is {MAX_IMAGE_PIXELS} pixels")
+    upload.file.seek(0)
+    return upload.file
+
+def check_base64_size(source: str, label: str) -> None:
+    """Reject a base64 image whose decoded size is over MAX_UPLOAD_BYTES, without decoding it"""
+    data = source.split(",", 1)[1] if "," in source else source
+    if len(data) * 3 // 4 > MAX_UPLOAD_BYTES:
+        raise HTTPException(413, f"{label} is larger than {MAX_UPLOAD_MB:.0f} MB")
 
-def encode_image(image: Image.Image) -> str:
-    """Encode PIL Image to base64"""
+def image_source(source: Union[str, BinaryIO]) -> Union[bytes, BinaryIO]:
+    """Base64 strings come from the JSON endpoint, spooled files from the upload endpoint"""
+    if isinstance(source, str):
+        if "," in source:
+            source = source.split(",")[1]
+        return base64.b64decode(source)
+    return source
+
+def encode_image(image: Image.Image) -> GeneratedImage:
+    """Encode PIL Image to PNG bytes"""
     buffer = io.BytesIO()
     image.save(buffer, format="PNG")
-    return f"data:image/png;base64,{base64.b64encode(buffer.getvalue()).decode()}"
+    return GeneratedImage(buffer.getvalue(), "image/png")
+
+class ImageError:
+    """A failed image, reported as a descriptor instead of a rendered placeholder"""
+
+    __slots__ = ("index", "error_class", "message")
 
-def create_error_placeholder(width: int, height: int, error_msg: str) -> str:
-    """Create an error placeholder image"""
+    def __init__(self, index: int, error: Exception):
+        self.index = index
+        self.error_class = classify_error(error)
+        self.message = str(error)[:200]
+
+    def to_dict(self) -> dict:
+        return {"index": self.index, "error": self.error_class, "message": self.message}
+
+ERROR_MESSAGES = {
+    "rate_limit": "Rate limit reached",
+    "no_image": "The model returned no image",
+    "error": "Image generation failed",
+}
+
+def classify_error(error: Exception) -> str:
+    """Coarse error class; placeholders are rendered per class, not per message"""
+    if is_rate_limit_error(error):
+        return "rate_limit"
+    if "no image" in str(error).lower():
+        return "no_image"
+    return "error"
+
+@lru_cache(maxsize=PLACEHOLDER_CACHE_SIZE)
+def render_placeholder(width: int, height: int, error_class: str) -> bytes:
+    """Draw and PNG-encode an error tile once per size and error class"""
     img = Image.new('RGB', (width, height), color=(30, 41, 59))
     draw = ImageDraw.Draw(img)
     
     lines = [
         "⚠️ Generation Error",
         "",
-        f"{error_msg[:60]}",
+        ERROR_MESSAGES.get(error_class, ERROR_MESSAGES["error"]),
         "",
         "This may be due to:",
         "• Rate limits (wait 5 min)",
@@ -114,240 +255,237 @@ def create_error_placeholder(width: int, height: int, error_msg: str) -> str:
         draw.text((x, y), line, fill=(248, 113, 113))
         y += 35
     
-    return encode_image(img)
+    return encode_image(img).data
+
+def create_error_placeholder(width: int, height: int, error: Exception) -> GeneratedImage:
+    """Error placeholder image, served from the renderer cache"""
+    return GeneratedImage(render_placeholder(width, height, classify_error(error)), "image/png")
 
 # --------------- GENERATION FUNCTIONS ----------------
-async def generate_images_from_text(
-    prompt: str, 
-    generation_type: str, 
-    num_images: int = 1
-) -> tuple[List[str], str]:
-    """
-    Generate images using Gemini 2.5 Flash Image Preview
-    Simple, direct, no Vertex AI needed!
-    """
+def extract_image(response) -> Optional[GeneratedImage]:
+    """Return the first non-empty inline image in a Gemini response"""
+    print(f"  🔍 Checking response for image data...")
+    print(f"  Has parts: {hasattr(response, 'parts')}")
+    
+    if not hasattr(response, 'parts'):
+        print(f"  ⚠️  Response has no parts attribute!")
+        return None
+    
+    print(f"  Number of parts: {len(response.parts)}")
+    for idx, part in enumerate(response.parts):
+        print(f"  Part {idx}: has inline_data = {hasattr(part, 'inline_data')}, has text = {hasattr(part, 'text')}")
+        
+        # Check if this part has text (might be an error or explanation)
+        if hasattr(part, 'text'):
+            print(f"     Text content: {part.text[:200]}")
+        
+        if hasattr(part, 'inline_data'):
+            data = part.inline_data.data
+            mime = part.inline_data.mime_type
+            
+            print(f"  📊 Inline data details (Part {idx}):")
+            print(f"     • Data type: {type(data)}")
+            print(f"     • Data length: {len(data) if data else 0} bytes")
+            print(f"     • MIME type: '{mime}'")
+            
+            # Skip if empty
+            if not data or len(data) == 0:
+                print(f"     ⚠️  Part {idx} is empty, checking next part...")
+                continue
+            
+            # Older SDK versions hand back base64 text instead of bytes
+            if isinstance(data, str):
+                data = base64.b64decode(data)
+            
+            return GeneratedImage(data, mime or "image/png")
+    
+    return None
+
+async def call_image_model(contents, prompt_text: str):
+    """Send one generation request through the key pool, rate limiter and image executor"""
+    # Route to the least-loaded healthy key and wait for quota on it
+    with key_pool.lease() as api_key:
+        await rate_limiter.acquire(IMAGE_MODEL, api_key.key, estimate_tokens(prompt_text))
+        try:
+            return await image_executor.run(model_registry.get(IMAGE_MODEL, api_key).generate_content, contents)
+        except Exception as e:
+            if is_quota_error(e):
+                # Take the key out of rotation; the retry goes to another one
+                key_pool.report_rate_limited(api_key)
+                await rate_limiter.apenalize(IMAGE_MODEL, api_key.key)
+            raise
+
+async def generate_uncached(contents, prompt_text: str) -> Optional[GeneratedImage]:
+    """One model call; None when the response holds no image"""
+    return extract_image(await call_image_model(contents, prompt_text))
+
+async def cached_image(key: str, producer, use_cache: bool = True) -> Optional[GeneratedImage]:
+    """Serve an image from the generation cache, or produce it once for all identical concurrent requests"""
+    if not use_cache:
+        return await producer()
+    
+    async def produce():
+        image = await producer()
+        return (image.data, image.mime_type) if image else None
     
-    # Rate limit handling
+    result = await generation_cache.get_or_generate(key, produce)
+    return GeneratedImage(*result) if result else None
+
+async def generate_one_image(
+    enhanced: str,
+    generation_type: str,
+    index: int,
+    num_images: int,
+    error_mode: str = "placeholder",
+    use_cache: bool = True
+) -> Union[GeneratedImage, ImageError]:
+    """Generate a single text-to-image result; a failure becomes a placeholder or descriptor, never an exception"""
+    # Rate limit handling: the shared limiter paces requests, so retries
+    # only happen when the API still answers 429
     max_retries = 5
-    base_delay = 15  # seconds
     
-    # Get dimensions
     width, height = DIMENSIONS.get(generation_type, (1024, 1024))
+    # Each slot of a multi-image request caches separately, so repeats keep their variety
+    key = generation_key(IMAGE_MODEL, enhanced, generation_type, variant=index)
     
-    # Enhance prompt
-    enhanced = enhance_prompt(prompt, generation_type)
+    print(f"  → Generating image {index+1}/{num_images}...")
     
     for attempt in range(max_retries):
         try:
-            print(f"🎨 Attempt {attempt + 1}/{max_retries} - Generating {num_images} image(s)...")
-            
-            # Initialize the image generation model
-            model = genai.GenerativeModel('gemini-2.5-flash-image')
-            
-            images = []
-            
-            for i in range(num_images):
-                # Add delay between images to avoid rate limits
-                if i > 0:
-                    print(f"⏳ Waiting 8 seconds before next image...")
-                    await asyncio.sleep(8)
-                
-                print(f"  → Generating image {i+1}/{num_images}...")
-                
-                try:
-                    # Generate!
-                    response = model.generate_content(enhanced)
-                    
-                    # Extract image data
-                    image_found = False
-                    print(f"  🔍 Checking response for image data...")
-                    print(f"  Has parts: {hasattr(response, 'parts')}")
-                    
-                    if hasattr(response, 'parts'):
-                        print(f"  Number of parts: {len(response.parts)}")
-                        for idx, part in enumerate(response.parts):
-                            print(f"  Part {idx}: has inline_data = {hasattr(part, 'inline_data')}, has text = {hasattr(part, 'text')}")
-                            
-                            # Check if this part has text (might be an error or explanation)
-                            if hasattr(part, 'text'):
-                                print(f"     Text content: {part.text[:200]}")
-                            
-                            if hasattr(part, 'inline_data'):
-                                data = part.inline_data.data
-                                mime = part.inline_data.mime_type
-                                
-                                print(f"  📊 Inline data details (Part {idx}):")
-                                print(f"     • Data type: {type(data)}")
-                                print(f"     • Data length: {len(data) if data else 0} bytes")
-                                print(f"     • MIME type: '{mime}'")
-                                
-                                # Skip if empty
-                                if not data or len(data) == 0:
-                                    print(f"     ⚠️  Part {idx} is empty, checking next part...")
-                                    continue
-                                
-                                # Convert to base64 if needed
-                                if isinstance(data, bytes):
-                                    data = base64.b64encode(data).decode()
-                                    print(f"     • Base64 length: {len(data)}")
-                                
-                                images.append(f"data:{mime};base64,{data}")
-                                print(f"  ✅ Image {i+1} generated! Final size: {len(f'data:{mime};base64,{data}')}")
-                                image_found = True
-                                break
-                    else:
-                        print(f"  ⚠️  Response has no parts attribute!")
-                    
-                    if not image_found:
-                        raise Exception("No image in response")
-                        
-                except Exception as img_error:
-                    print(f"  ❌ Failed: {img_error}")
-                    # Add placeholder for failed image
-                    images.append(create_error_placeholder(width, height, str(img_error)))
+            # Generate!
+            image = await cached_image(key, lambda: generate_uncached(enhanced, enhanced), use_cache)
+            if not image:
+                raise Exception("No image in response")
             
-            return images, enhanced
+            print(f"  ✅ Image {index+1} generated! Final size: {len(image.data)} bytes")
+            return image
             
-        except Exception as e:
-            error_msg = str(e)
-            
-            # Check for rate limit
-            is_rate_limit = any(x in error_msg.lower() for x in ['429', 'rate', 'quota', 'exhausted'])
-            
-            if is_rate_limit and attempt < max_retries - 1:
-                wait = base_delay * (2 ** attempt)  # Exponential backoff
-                print(f"⚠️  Rate limit hit! Waiting {wait}s before retry...")
-                await asyncio.sleep(wait)
+        except Exception as img_error:
+            if is_quota_error(img_error) and attempt < max_retries - 1:
+                print(f"⚠️  Rate limit hit! Retrying image {index+1} on another key (attempt {attempt + 2}/{max_retries})...")
                 continue
-            else:
-                # Out of retries or non-rate-limit error
-                if is_rate_limit:
-                    raise Exception(f"Rate limit exceeded. Please wait 5 minutes and try again.")
-                else:
-                    raise Exception(f"Generation failed: {error_msg}")
+            
+            print(f"  ❌ Image {index+1} failed: {img_error}")
+            if error_mode == "descriptor":
+                return ImageError(index, img_error)
+            # Placeholder for failed image
+            return create_error_placeholder(width, height, img_error)
     
-    raise Exception("Failed after all retries")
+    return create_error_placeholder(width, height, Exception("Failed after all retries"))
+
+async def generate_images_from_text(
+    prompt: str, 
+    generation_type: str, 
+    num_images: int = 1,
+    error_mode: str = "placeholder",
+    use_cache: bool = True,
+    on_result: Optional[Callable[[int, Union[GeneratedImage, ImageError]], Awaitable[None]]] = None
+) -> tuple[List[Union[GeneratedImage, ImageError]], str]:
+    """
+    Generate images using Gemini 2.5 Flash Image Preview
+    Simple, direct, no Vertex AI needed!
+    """
+    
+    # Enhance prompt
+    enhanced = enhance_prompt(prompt, generation_type)
+    
+    print(f"🎨 Generating {num_images} image(s)...")
+    
+    # All images are requested at once; the image executor and rate limiter decide
+    # how many actually run, and each one fails on its own without cancelling the rest
+    async def generate(index: int):
+        result = await generate_one_image(enhanced, generation_type, index, num_images, error_mode, use_cache)
+        if on_result is not None:
+            await on_result(index, result)
+        return result
+    
+    images = await asyncio.gather(*[generate(i) for i in range(num_images)])
+    
+    return list(images), enhanced
 
 
+async def prepare_part(source: Union[str, BinaryIO], size: tuple[int, int]) -> dict:
+    """Preprocess one input image on the worker pool into a Gemini inline-data part"""
+    data, mime_type = await preprocess_executor.run(lambda: prepare_image(image_source(source), size))
+    return {"mime_type": mime_type, "data": data}
+
 async def generate_images_from_image(
     prompt: str,
     generation_type: str,
-    base_image: str,
-    reference_images: List[str] = None,
-    strength: float = 0.75
-) -> tuple[List[str], str]:
+    base_image: Union[str, BinaryIO],
+    reference_images: List[Union[str, BinaryIO]] = None,
+    strength: float = 0.75,
+    use_cache: bool = True
+) -> tuple[List[GeneratedImage], str]:
     """
     Transform an image using Gemini 2.5 Flash Image (proper image editing)
     According to: https://ai.google.dev/gemini-api/docs/image-generation#python_1
     """
     
     max_retries = 5
-    base_delay = 15
     
     width, height = DIMENSIONS.get(generation_type, (1024, 1024))
     
+    # Decode, resize and encode every input once per request; retries reuse the parts
+    try:
+        base_part = await prepare_part(base_image, (width, height))
+    except Exception as e:
+        raise Exception(f"Invalid base image: {e}")
+    
+    # Build content list with prompt and images
+    content_parts = [None, base_part]
+    
+    # Add reference images if provided (for composition/style transfer)
+    if reference_images and len(reference_images) > 0:
+        print(f"🎨 Using {len(reference_images)} reference image(s) for composition/style transfer...")
+        references = await asyncio.gather(
+            *[prepare_part(ref, (width, height)) for ref in reference_images[:MAX_REFERENCE_IMAGES]],
+            return_exceptions=True
+        )
+        for idx, ref_part in enumerate(references):
+            if isinstance(ref_part, Exception):
+                print(f"   ⚠️  Failed to process reference image {idx + 1}: {ref_part}")
+                continue
+            content_parts.append(ref_part)
+            print(f"   ✅ Reference image {idx + 1} added")
+    
+    # Enhance the prompt for the specific generation type
+    enhanced_prompt = enhance_prompt(prompt, generation_type)
+    
+    # Update prompt based on number of images
+    if reference_images and len(reference_images) > 0:
+        full_prompt = f"{enhanced_prompt} Using the provided images, {prompt}"
+    else:
+        full_prompt = f"{enhanced_prompt} Based on the provided image, {prompt}"
+    
+    # The first part is the final prompt
+    content_parts[0] = full_prompt
+    key = generation_key(IMAGE_MODEL, full_prompt, generation_type, [part["data"] for part in content_parts[1:]])
+    
     for attempt in range(max_retries):
         try:
-            # Decode the base image
-            img = decode_image(base_image)
-            img = img.resize((width, height), Image.Resampling.LANCZOS)
-            
-            # Convert to bytes for Gemini
-            img_bytes = io.BytesIO()
-            img.save(img_bytes, format='PNG')
-            img_bytes = img_bytes.getvalue()
-            
-            # Enhance the prompt for the specific generation type
-            enhanced_prompt = enhance_prompt(prompt, generation_type)
-            
-            # Build content list with prompt and images
-            content_parts = [enhanced_prompt]
-            
-            # Add base image
-            content_parts.append({"mime_type": "image/png", "data": img_bytes})
-            
-            # Add reference images if provided (for composition/style transfer)
-            if reference_images and len(reference_images) > 0:
-                print(f"🎨 Using {len(reference_images)} reference image(s) for composition/style transfer...")
-                for idx, ref_img_b64 in enumerate(reference_images[:3]):  # Limit to 3 reference images
-                    try:
-                        ref_img = decode_image(ref_img_b64)
-                        ref_img = ref_img.resize((width, height), Image.Resampling.LANCZOS)
-                        
-                        ref_bytes = io.BytesIO()
-                        ref_img.save(ref_bytes, format='PNG')
-                        
-                        content_parts.append({"mime_type": "image/png", "data": ref_bytes.getvalue()})
-                        print(f"   ✅ Reference image {idx + 1} added")
-                    except Exception as e:
-                        print(f"   ⚠️  Failed to process reference image {idx + 1}: {e}")
-            
-            # Update prompt based on number of images
-            if reference_images and len(reference_images) > 0:
-                full_prompt = f"{enhanced_prompt} Using the provided images, {prompt}"
-            else:
-                full_prompt = f"{enhanced_prompt} Based on the provided image, {prompt}"
-            
-            # Update the first part with the final prompt
-            content_parts[0] = full_prompt
-            
             print(f"🔄 Transforming with Gemini 2.5 Flash Image...")
             print(f"   Total inputs: 1 prompt + {len(content_parts) - 1} image(s)")
             print(f"   Prompt: {full_prompt[:100]}...")
             
-            # Initialize the image generation model
-            image_model = genai.GenerativeModel('gemini-2.5-flash-image')
-            
             # Pass prompt and ALL images to the model
             # Supports: single image edit, multi-image composition, style transfer
-            response = image_model.generate_content(content_parts)
+            image = await cached_image(key, lambda: generate_uncached(content_parts, full_prompt), use_cache)
+            if image:
+                print(f"  ✅ Image transformed! Final size: {len(image.data)} bytes")
+                return [image], full_prompt
             
-            # Extract generated image
-            image_found = False
-            print(f"  🔍 Checking response for transformed image...")
-            
-            if hasattr(response, 'parts'):
-                print(f"  Number of parts: {len(response.parts)}")
-                for idx, part in enumerate(response.parts):
-                    print(f"  Part {idx}: has inline_data = {hasattr(part, 'inline_data')}, has text = {hasattr(part, 'text')}")
-                    
-                    # Check if this part has text
-                    if hasattr(part, 'text'):
-                        print(f"     Text content: {part.text[:200]}")
-                    
-                    if hasattr(part, 'inline_data'):
-                        data = part.inline_data.data
-                        mime = part.inline_data.mime_type
-                        
-                        print(f"  📊 Inline data details (Part {idx}):")
-                        print(f"     • Data type: {type(data)}")
-                        print(f"     • Data length: {len(data) if data else 0} bytes")
-                        print(f"     • MIME type: '{mime}'")
-                        
-                        # Skip if empty
-                        if not data or len(data) == 0:
-                            print(f"     ⚠️  Part {idx} is empty, checking next part...")
-                            continue
-                        
-                        if isinstance(data, bytes):
-                            data = base64.b64encode(data).decode()
-                            print(f"     • Base64 length: {len(data)}")
-                        
-                        print(f"  ✅ Image transformed! Final size: {len(f'data:{mime};base64,{data}')}")
-                        return [f"data:{mime};base64,{data}"], full_prompt
-            
-            # Fallback: return enhanced original
+            # Fallback: return the resized original
             print("⚠️  No transformation found, returning enhanced original")
-            return [encode_image(img)], full_prompt
+            return [GeneratedImage(base_part["data"], base_part["mime_type"])], full_prompt
             
         except Exception as e:
             error_msg = str(e)
-            is_rate_limit = any(x in error_msg.lower() for x in ['429', 'rate', 'quota', 'exhausted'])
+            is_rate_limit = is_rate_limit_error(e)
             
-            if is_rate_limit and attempt < max_retries - 1:
-                wait = base_delay * (2 ** attempt)
-                print(f"⚠️  Rate limit! Waiting {wait}s...")
-                await asyncio.sleep(wait)
+            if is_quota_error(e) and attempt < max_retries - 1:
+                # The key pool and limiter route the next attempt to a key with quota
+                print(f"⚠️  Rate limit! Retrying on another key (attempt {attempt + 2}/{max_retries})...")
                 continue
             else:
                 if is_rate_limit:
@@ -358,13 +496,84 @@ async def generate_images_from_image(
     raise Exception("Failed after all retries")
 
 
+# --------------- RESPONSES ----------------
+def multipart_response(images: List[GeneratedImage]) -> StreamingResponse:
+    """Stream images as multipart/mixed parts without building one combined buffer"""
+    boundary = uuid.uuid4().hex
+
+    def parts():
+        for idx, image in enumerate(images):
+            yield (
+                f"--{boundary}\r\n"
+                f"Content-Type: {image.mime_type}\r\n"
+                f"Content-Length: {len(image.data)}\r\n"
+                f'Content-Disposition: attachment; name="image"; filename="image-{idx + 1}"\r\n\r\n'
+            ).encode()
+            yield image.data
+            yield b"\r\n"
+        yield f"--{boundary}--\r\n".encode()
+
+    return StreamingResponse(
+        parts(),
+        media_type=f"multipart/mixed; boundary={boundary}",
+        headers={"X-Image-Count": str(len(images))}
+    )
+
+async def build_response(
+    results: List[Union[GeneratedImage, ImageError]],
+    prompt_used: str,
+    generation_type: str,
+    message: str,
+    response_mode: str
+):
+    """Shape generated images (and descriptors for failed ones) for the requested response mode"""
+    images = [result for result in results if isinstance(result, GeneratedImage)]
+    errors = [result.to_dict() for result in results if isinstance(result, ImageError)] or None
+    if not images:
+        return GenerationResponse(
+            success=False,
+            images=[],
+            prompt_used=prompt_used,
+            generation_type=generation_type,
+            message="No images generated",
+            errors=errors
+        )
+    if response_mode in ("binary", "multipart"):
+        response = (
+            Response(content=images[0].data, media_type=images[0].mime_type)
+            if response_mode == "binary" and len(images) == 1
+            else multipart_response(images)
+        )
+        if errors:
+            response.headers["X-Generation-Errors"] = json.dumps(errors)
+        return response
+    if response_mode == "url":
+        urls = [f"/images/{await blob_store.aput(image.data, image.mime_type)}" for image in images]
+        return GenerationResponse(
+            success=True,
+            images=urls,
+            prompt_used=prompt_used,
+            generation_type=generation_type,
+            message=message,
+            errors=errors
+        )
+    return GenerationResponse(
+        success=True,
+        images=[image.data_url() for image in images],
+        prompt_used=prompt_used,
+        generation_type=generation_type,
+        message=message,
+        errors=errors
+    )
+
+
 # --------------- ROUTES ----------------
 @app.get("/")
 async def root():
     return {
         "service": "Cre8Canvas AI Image Generator",
         "version": "2.0.0",
-        "model": "gemini-2.5-flash-image",
+        "model": IMAGE_MODEL,
         "types": ["thumbnail", "advertisement", "poster"]
     }
 
@@ -372,11 +581,69 @@ async def root():
 async def health():
     return {
         "status": "healthy",
-        "api_configured": bool(GOOGLE_API_KEY),
-        "model": "gemini-2.5-flash-image",
+        "api_configured": bool(key_pool.keys),
+        "model": IMAGE_MODEL,
         "note": "No Vertex AI needed - using Google AI Studio API"
     }
 
+@app.get("/metrics")
+async def metrics():
+    """Get image generation queue depth, wait times, rate limiter and API key usage"""
+    return {
+        "image_generation": image_executor.snapshot(),
+        "image_preprocess": preprocess_executor.snapshot(),
+        "rate_limiter": rate_limiter.snapshot(),
+        "api_keys": key_pool.snapshot(),
+        "blob_store": blob_store.stats(),
+        "placeholder_cache": render_placeholder.cache_info()._asdict(),
+        "model_registry": model_registry.snapshot(),
+        "generation_cache": generation_cache.stats(),
+        "jobs": job_queue.snapshot()
+    }
+
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    """Reject oversized uploads from Content-Length, before the body is read"""
+    if request.url.path == "/generate/image-to-image/upload":
+        length = request.headers.get("content-length")
+        if length and not length.isdecimal():
+            return JSONResponse(status_code=400, content={"detail": "Invalid Content-Length"})
+        if length and int(length) > MAX_UPLOAD_BYTES * (1 + MAX_REFERENCE_IMAGES):
+            return JSONResponse(status_code=413, content={"detail": "Upload too large"})
+    return await call_next(request)
+
+@app.get("/images/{image_id}")
+async def get_image(image_id: str):
+    """Serve an image stored by a "url" mode generation request"""
+    blob = blob_store.get(image_id)
+    if blob is None:
+        raise HTTPException(404, "Image not found")
+    path, mime_type = blob
+    return FileResponse(path, media_type=mime_type, headers={"Cache-Control": "public, max-age=31536000, immutable"})
+
+@app.get("/health/models")
+async def health_models():
+    """Model/key reachability from count_tokens probes, re-probed at most every MODEL_PROBE_TTL seconds"""
+    probes = await model_registry.probe_all()
+    healthy = all(result["ok"] for per_key in probes.values() for result in per_key.values())
+    return {
+        "status": "healthy" if healthy else "degraded",
+        "probes": probes
+    }
+
+@app.on_event("startup")
+async def startup():
+    await job_queue.start()
+    model_registry.warm_up()
+    if MODEL_WARMUP_PROBE:
+        await model_registry.probe_all()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await job_queue.stop()
+    image_executor.shutdown()
+    preprocess_executor.shutdown()
+
 @app.post("/generate/text-to-image", response_model=GenerationResponse)
 async def text_to_image_endpoint(request: TextToImageRequest):
     """Generate images from text"""
@@ -387,20 +654,33 @@ async def text_to_image_endpoint(request: TextToImageRequest):
         if request.generation_type not in DIMENSIONS:
             raise HTTPException(400, f"Invalid type. Use: {list(DIMENSIONS.keys())}")
         
+        if request.response_mode not in RESPONSE_MODES:
+            raise HTTPException(400, f"Invalid response_mode. Use: {list(RESPONSE_MODES)}")
+        
+        if request.error_mode not in ERROR_MODES:
+            raise HTTPException(400, f"Invalid error_mode. Use: {list(ERROR_MODES)}")
+        
+        if not 1 <= (request.num_images or 1) <= MAX_IMAGES_PER_REQUEST:
+            raise HTTPException(400, f"num_images must be between 1 and {MAX_IMAGES_PER_REQUEST}")
+        
         images, prompt_used = await generate_images_from_text(
             request.prompt,
             request.generation_type,
-            request.num_images or 1
+            request.num_images or 1,
+            request.error_mode,
+            request.use_cache is not False
         )
         
-        return GenerationResponse(
-            success=True,
-            images=images,
-            prompt_used=prompt_used,
-            generation_type=request.generation_type,
-            message=f"Generated {len(images)} image(s)"
+        return await build_response(
+            images,
+            prompt_used,
+            request.generation_type,
+            f"Generated {len(images)} image(s)",
+            request.response_mode
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ Error: {e}")
         raise HTTPException(500, str(e))
@@ -419,25 +699,231 @@ async def image_to_image_endpoint(request: ImageToImageRequest):
         if request.generation_type not in DIMENSIONS:
             raise HTTPException(400, f"Invalid type. Use: {list(DIMENSIONS.keys())}")
         
+        if request.response_mode not in RESPONSE_MODES:
+            raise HTTPException(400, f"Invalid response_mode. Use: {list(RESPONSE_MODES)}")
+        
         images, prompt_used = await generate_images_from_image(
             request.prompt,
             request.generation_type,
             request.base_image,
             request.reference_images or [],
-            request.strength or 0.75
+            request.strength or 0.75,
+            request.use_cache is not False
         )
         
-        return GenerationResponse(
-            success=True,
-            images=images,
-            prompt_used=prompt_used,
-            generation_type=request.generation_type,
-            message="Image transformed"
+        return await build_response(
+            images,
+            prompt_used,
+            request.generation_type,
+            "Image transformed",
+            request.response_mode
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        raise HTTPException(500, str(e))
+
+
+@app.post("/generate/image-to-image/upload", response_model=GenerationResponse)
+async def image_to_image_upload_endpoint(
+    prompt: str = Form(...),
+    generation_type: str = Form(...),
+    base_image: UploadFile = File(...),
+    reference_images: List[UploadFile] = File([]),
+    negative_prompt: Optional[str] = Form(None),
+    strength: float = Form(0.75),
+    response_mode: str = Form("json"),
+    use_cache: bool = Form(True)
+):
+    """Transform uploaded images (multipart/form-data, no base64)"""
+    try:
+        if not prompt.strip():
+            raise HTTPException(400, "Prompt required")
+        
+        if generation_type not in DIMENSIONS:
+            raise HTTPException(400, f"Invalid type. Use: {list(DIMENSIONS.keys())}")
+        
+        if response_mode not in RESPONSE_MODES:
+            raise HTTPException(400, f"Invalid response_mode. Use: {list(RESPONSE_MODES)}")
+        
+        if len(reference_images) > MAX_REFERENCE_IMAGES:
+            raise HTTPException(400, f"At most {MAX_REFERENCE_IMAGES} reference images")
+        
+        base = open_upload(base_image, "Base image")
+        references = [
+            open_upload(upload, f"Reference image {idx + 1}")
+            for idx, upload in enumerate(reference_images)
+        ]
+        
+        images, prompt_used = await generate_images_from_image(
+            prompt,
+            generation_type,
+            base,
+            references,
+            strength,
+            use_cache
+        )
+        
+        return await build_response(
+            images,
+            prompt_used,
+            generation_type,
+            "Image transformed",
+            response_mode
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ Error: {e}")
         raise HTTPException(500, str(e))
+    finally:
+        await base_image.close()
+        for upload in reference_images:
+            await upload.close()
+
+
+# --------------- JOBS ----------------
+async def job_entry(index: int, result: Union[GeneratedImage, ImageError]) -> dict:
+    """Per-image job result; image bytes go to the blob store, the job only keeps the URL"""
+    if isinstance(result, ImageError):
+        return result.to_dict()
+    return {"index": index, "url": f"/images/{await blob_store.aput(result.data, result.mime_type)}"}
+
+def job_links(job: dict) -> dict:
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "status_url": f"/jobs/{job['id']}",
+        "events_url": f"/jobs/{job['id']}/events"
+    }
+
+async def submit_job(kind: str, total: int, handler) -> JSONResponse:
+    try:
+        job = await job_queue.submit(kind, total, handler)
+    except QueueFull:
+        raise HTTPException(503, "Too many queued jobs, try again later", headers={"Retry-After": "30"})
+    return JSONResponse(status_code=202, content=job_links(job))
+
+@app.post("/jobs/text-to-image", status_code=202)
+async def text_to_image_job(request: TextToImageRequest):
+    """Queue a text-to-image generation and return its job id immediately"""
+    if not request.prompt.strip():
+        raise HTTPException(400, "Prompt required")
+    
+    if request.generation_type not in DIMENSIONS:
+        raise HTTPException(400, f"Invalid type. Use: {list(DIMENSIONS.keys())}")
+    
+    if request.error_mode not in ERROR_MODES:
+        raise HTTPException(400, f"Invalid error_mode. Use: {list(ERROR_MODES)}")
+    
+    num_images = request.num_images or 1
+    if not 1 <= num_images <= MAX_IMAGES_PER_REQUEST:
+        raise HTTPException(400, f"num_images must be between 1 and {MAX_IMAGES_PER_REQUEST}")
+    
+    async def handler(job_id: str) -> dict:
+        async def on_result(index, result):
+            await job_queue.report(job_id, await job_entry(index, result))
+        
+        images, prompt_used = await generate_images_from_text(
+            request.prompt,
+            request.generation_type,
+            num_images,
+            request.error_mode,
+            request.use_cache is not False,
+            on_result
+        )
+        job = await job_queue.get(job_id)
+        return {
+            "prompt_used": prompt_used,
+            "generation_type": request.generation_type,
+            "images": sorted(job["results"], key=lambda entry: entry["index"])
+        }
+    
+    return await submit_job("text-to-image", num_images, handler)
+
+@app.post("/jobs/image-to-image", status_code=202)
+async def image_to_image_job(request: ImageToImageRequest):
+    """Queue an image-to-image transformation and return its job id immediately"""
+    if not request.prompt.strip():
+        raise HTTPException(400, "Prompt required")
+    
+    if not request.base_image:
+        raise HTTPException(400, "Base image required")
+    
+    if request.generation_type not in DIMENSIONS:
+        raise HTTPException(400, f"Invalid type. Use: {list(DIMENSIONS.keys())}")
+    
+    # Queued jobs hold their input images in memory until a worker starts them, so the
+    # size limit is enforced here and only the images that will be used are kept
+    base_image = request.base_image
+    reference_images = (request.reference_images or [])[:MAX_REFERENCE_IMAGES]
+    check_base64_size(base_image, "Base image")
+    for idx, ref in enumerate(reference_images):
+        check_base64_size(ref, f"Reference image {idx + 1}")
+    prompt, generation_type = request.prompt, request.generation_type
+    strength, use_cache = request.strength or 0.75, request.use_cache is not False
+    
+    async def handler(job_id: str) -> dict:
+        images, prompt_used = await generate_images_from_image(
+            prompt,
+            generation_type,
+            base_image,
+            reference_images,
+            strength,
+            use_cache
+        )
+        entries = [await job_entry(index, image) for index, image in enumerate(images)]
+        for entry in entries:
+            await job_queue.report(job_id, entry)
+        return {
+            "prompt_used": prompt_used,
+            "generation_type": generation_type,
+            "images": entries
+        }
+    
+    return await submit_job("image-to-image", 1, handler)
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Current status, progress and per-image results of a job"""
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(404, "Job not found")
+    return job
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """Server-sent events: status changes, each image as it finishes, then the final result"""
+    if await job_queue.get(job_id) is None:
+        raise HTTPException(404, "Job not found")
+    
+    async def stream():
+        status = None
+        sent = 0
+        async for job in job_queue.watch(job_id):
+            if job["status"] != status:
+                status = job["status"]
+                yield f"data: {json.dumps({'type': 'status', 'status': status, 'completed': job['completed'], 'total': job['total']})}\n\n"
+            for entry in job["results"][sent:]:
+                yield f"data: {json.dumps({'type': 'image', 'completed': job['completed'], 'total': job['total'], **entry})}\n\n"
+            sent = len(job["results"])
+            if status == "done":
+                yield f"data: {json.dumps({'type': 'done', 'result': job['result']})}\n\n"
+            elif status == "failed":
+                yield f"data: {json.dumps({'type': 'error', 'error': job['error']})}\n\n"
+    
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no"
+        }
+    )
 
 
 @app.get("/types")
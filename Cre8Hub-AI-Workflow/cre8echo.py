@@ -5,25 +5,147 @@ from pydantic import BaseModel
 import json
 import os
 import asyncio
-from typing import Optional, Dict, Any, AsyncGenerator
-from langchain_core.prompts import PromptTemplate
+import time
+from functools import lru_cache
+from typing import Optional, Dict, Any, AsyncGenerator, List, Tuple
+from langchain_core.prompts import PromptTemplate, ChatPromptTemplate
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import Runnable
 from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.chains import LLMChain
 from langchain.callbacks.streaming_stdout import StreamingStdOutCallbackHandler
 from langchain.callbacks.base import BaseCallbackHandler
 from services.chain import PLATFORM_TEMPLATES
-from models.models import ContentRequest, SaveOutputRequest
+from services.rate_limiter import get_rate_limiter, RateLimitCallbackHandler, is_quota_error
+from services.key_pool import get_key_pool
+from services.executors import BoundedExecutor, ExecutorSaturated
+from services.prompt_cache import get_prompt_cache, split_template, GeminiContextCache, PromptPrefixCache
+from services.datastore import DataStore
+from services.persona_store import PersonaStore, PersonaNotFound, PersonaUnavailable
+from models.models import ContentRequest, MultiPlatformRequest, SaveOutputRequest, Critique
+from utils.utils import strip_code_fences
 from dotenv import load_dotenv
 load_dotenv()
 
 # --------------- STREAMING CALLBACK HANDLER ----------------
 
 class StreamingCallbackHandler(BaseCallbackHandler):
-    def __init__(self):
+    """Forward LLM tokens from the executor thread onto an asyncio queue"""
+
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None, queue: Optional[asyncio.Queue] = None):
         self.tokens = []
+        self.loop = loop
+        self.queue = queue
     
     def on_llm_new_token(self, token: str, **kwargs) -> None:
         self.tokens.append(token)
+        if self.loop is not None and self.queue is not None:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, token)
+
+# Tokens are coalesced into chunks of at least this many characters, or flushed
+# after STREAM_FLUSH_INTERVAL seconds, whichever comes first
+STREAM_CHUNK_CHARS = int(os.getenv("STREAM_CHUNK_CHARS", "48"))
+STREAM_FLUSH_INTERVAL = float(os.getenv("STREAM_FLUSH_INTERVAL", "0.05"))
+
+_STREAM_DONE = object()
+
+class StreamMetrics:
+    """Process-wide time-to-first-byte and throughput counters for streamed generations"""
+
+    def __init__(self):
+        self.generations = 0
+        self.total_tokens = 0
+        self.total_ttfb_ms = 0.0
+        self.total_duration_ms = 0.0
+
+    def record(self, ttfb_ms: Optional[float], tokens: int, duration_ms: float) -> None:
+        self.generations += 1
+        self.total_tokens += tokens
+        self.total_ttfb_ms += ttfb_ms or 0.0
+        self.total_duration_ms += duration_ms
+
+    def snapshot(self) -> Dict[str, Any]:
+        count = self.generations or 1
+        seconds = self.total_duration_ms / 1000
+        return {
+            "generations": self.generations,
+            "avg_ttfb_ms": round(self.total_ttfb_ms / count, 1),
+            "avg_duration_ms": round(self.total_duration_ms / count, 1),
+            "tokens_per_sec": round(self.total_tokens / seconds, 1) if seconds else 0.0,
+        }
+
+stream_metrics = StreamMetrics()
+
+class TokenStream:
+    """Run a blocking LLM call on a bounded executor and yield its tokens as coalesced chunks"""
+
+    def __init__(self, chunk_chars: int = STREAM_CHUNK_CHARS, flush_interval: float = STREAM_FLUSH_INTERVAL):
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.handler = StreamingCallbackHandler(self.loop, self.queue)
+        self.chunk_chars = chunk_chars
+        self.flush_interval = flush_interval
+        self.text = ""
+        self.metrics: Dict[str, Any] = {}
+
+    async def run(self, fn, executor: BoundedExecutor) -> AsyncGenerator[str, None]:
+        """Call fn(callbacks) on the executor, yielding chunks until it returns"""
+        started = time.perf_counter()
+        first_token_at = None
+        streamed = 0
+        buffer = []
+        buffered = 0
+        last_flush = started
+
+        future = asyncio.ensure_future(executor.run(fn, [self.handler]))
+        future.add_done_callback(lambda _: self.queue.put_nowait(_STREAM_DONE))
+
+        while True:
+            timeout = max(self.flush_interval - (time.perf_counter() - last_flush), 0) if buffer else None
+            try:
+                token = await asyncio.wait_for(self.queue.get(), timeout)
+            except asyncio.TimeoutError:
+                token = None
+
+            if token is _STREAM_DONE:
+                break
+            if token:
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                buffer.append(token)
+                buffered += len(token)
+
+            now = time.perf_counter()
+            # The first chunk goes out immediately to keep time-to-first-byte low
+            if buffer and (not streamed or buffered >= self.chunk_chars or now - last_flush >= self.flush_interval):
+                chunk = "".join(buffer)
+                buffer, buffered, last_flush = [], 0, now
+                streamed += len(chunk)
+                yield chunk
+
+        if buffer:
+            chunk = "".join(buffer)
+            streamed += len(chunk)
+            yield chunk
+
+        # Re-raises any error from the LLM call
+        self.text = future.result() or ""
+
+        # Models that ignore streaming=True still deliver the full text at the end
+        if not self.handler.tokens and self.text:
+            first_token_at = time.perf_counter()
+            for start in range(0, len(self.text), self.chunk_chars):
+                yield self.text[start:start + self.chunk_chars]
+
+        duration_ms = (time.perf_counter() - started) * 1000
+        ttfb_ms = (first_token_at - started) * 1000 if first_token_at else None
+        tokens = len(self.handler.tokens)
+        self.metrics = {
+            "ttfb_ms": round(ttfb_ms, 1) if ttfb_ms is not None else None,
+            "duration_ms": round(duration_ms, 1),
+            "tokens": tokens,
+            "tokens_per_sec": round(tokens / (duration_ms / 1000), 1) if duration_ms else 0.0,
+        }
+        stream_metrics.record(ttfb_ms, tokens, duration_ms)
 
 # --------------- CONFIG ----------------
 app = FastAPI(title="Multi-Platform Content Generator", version="1.0.0")
@@ -55,13 +177,16 @@ app.add_middleware(
     max_age=86400,  # Cache preflight for 24 hours
 )
 
-# Environment variable validation
+# Environment variable validation - GOOGLE_API_KEYS (comma-separated) spreads load over several keys
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 print("GOOGLE_API_KEY:", "Set" if GOOGLE_API_KEY else "Not Set")
 
-if not GOOGLE_API_KEY:
+if not GOOGLE_API_KEY and not os.getenv("GOOGLE_API_KEYS"):
     raise ValueError("GOOGLE_API_KEY is not set. Please export it before running.")
 
+key_pool = get_key_pool()
+print(f"API keys in pool: {len(key_pool.keys)}")
+
 # Load persona JSON with error handling
 try:
     with open("responses.json", "r") as f:
@@ -73,36 +198,149 @@ except FileNotFoundError:
 except json.JSONDecodeError:
     raise ValueError("Invalid JSON format in responses.json file.")
 
-# LLM setup with streaming support
+# Per-user personas (ContentRequest.user_id) come from MongoDB through an in-memory
+# cache; responses.json stays the persona for requests without a user_id
+datastore = DataStore()
+persona_store = PersonaStore(datastore)
+
+@app.on_event("startup")
+async def startup():
+    await datastore.connect()
+    await persona_store.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await persona_store.stop()
+    await datastore.close()
+    for executor in llm_executors.values():
+        executor.shutdown()
+
+# Upper bound on ContentRequest.drafts (best-of-N drafts per refinement round)
+ECHO_MAX_DRAFTS = int(os.getenv("ECHO_MAX_DRAFTS", "4"))
+
+# Critic scores (0-10) at or above this end the loop; ContentRequest.pass_score overrides it
+ECHO_PASS_SCORE = float(os.getenv("ECHO_PASS_SCORE", "8.0"))
+# Stop early once the best score has gained less than ECHO_PLATEAU_DELTA for
+# ECHO_PLATEAU_ROUNDS rounds in a row
+ECHO_PLATEAU_DELTA = float(os.getenv("ECHO_PLATEAU_DELTA", "0.5"))
+ECHO_PLATEAU_ROUNDS = int(os.getenv("ECHO_PLATEAU_ROUNDS", "1"))
+# Fixes carried into the next generator prompt, each cut to ECHO_FEEDBACK_CHARS
+ECHO_FEEDBACK_ITEMS = int(os.getenv("ECHO_FEEDBACK_ITEMS", "3"))
+ECHO_FEEDBACK_CHARS = int(os.getenv("ECHO_FEEDBACK_CHARS", "200"))
+
+# Platforms of one /generate-stream/multi request that run their loops at the same time
+ECHO_FANOUT_CONCURRENCY = int(os.getenv("ECHO_FANOUT_CONCURRENCY", "4"))
+
+# Generator and critic calls run on their own bounded pools rather than the loop's
+# default executor. Up to ECHO_EXECUTOR_MAX_QUEUE calls per pool wait for a worker;
+# beyond that new streams are refused with 503 + Retry-After instead of queueing
+ECHO_GENERATOR_WORKERS = int(os.getenv("ECHO_GENERATOR_WORKERS", "16"))
+ECHO_CRITIC_WORKERS = int(os.getenv("ECHO_CRITIC_WORKERS", "8"))
+ECHO_EXECUTOR_MAX_QUEUE = int(os.getenv("ECHO_EXECUTOR_MAX_QUEUE", "64"))
+ECHO_RETRY_AFTER = int(os.getenv("ECHO_RETRY_AFTER", "5"))
+llm_executors = {
+    "generator": BoundedExecutor("echo-generator", ECHO_GENERATOR_WORKERS, max_queue=ECHO_EXECUTOR_MAX_QUEUE),
+    "critic": BoundedExecutor("echo-critic", ECHO_CRITIC_WORKERS, max_queue=ECHO_EXECUTOR_MAX_QUEUE),
+}
+
+# Every generator/critic call waits for quota on the shared limiter first
+ECHO_MODEL = "gemini-2.0-flash-exp"
+rate_limiter = get_rate_limiter()
+
+# LLM setup with streaming support - one generator/critic pair per API key
+def build_llms(api_key: str) -> Dict[str, ChatGoogleGenerativeAI]:
+    return {
+        "generator": ChatGoogleGenerativeAI(
+            model=ECHO_MODEL,
+            google_api_key=api_key,
+            temperature=0.9,
+            max_output_tokens=4048,
+            streaming=True,  # Enable streaming
+            callbacks=[RateLimitCallbackHandler(rate_limiter, ECHO_MODEL, api_key)]
+        ),
+        "critic": ChatGoogleGenerativeAI(
+            model=ECHO_MODEL,
+            google_api_key=api_key,
+            temperature=0.7,
+            max_output_tokens=2048,
+            streaming=True,  # Enable streaming
+            callbacks=[RateLimitCallbackHandler(rate_limiter, ECHO_MODEL, api_key)]
+        ),
+    }
+
 try:
-    generator_llm = ChatGoogleGenerativeAI(
-        model="gemini-2.0-flash-exp",
-        google_api_key=GOOGLE_API_KEY,
-        temperature=0.9,
-        max_output_tokens=4048,
-        streaming=True  # Enable streaming
-    )
-    critic_llm = ChatGoogleGenerativeAI(
-        model="gemini-2.0-flash-exp",
-        google_api_key=GOOGLE_API_KEY,
-        temperature=0.7,
-        max_output_tokens=2048,
-        streaming=True  # Enable streaming
-    )
+    llms_by_key = {api_key.id: build_llms(api_key.key) for api_key in key_pool.keys}
     print("LLM models initialized successfully")
 except Exception as e:
     raise ValueError(f"Failed to initialize LLM models: {str(e)}")
 
-# Platform-specific content templates (same as before)
+# --------------- PROMPTS & CHAINS ----------------
+# Templates are parsed once per platform and chains built once per platform, role and
+# API key. Per-request callbacks (token streaming) are passed at invoke time via config.
+#
+# Each template is split into a stable prefix (persona + platform instructions), sent
+# first as the system message, and a per-call suffix. Identical leading tokens let the
+# provider reuse its prefix cache; with PROMPT_CACHE_BACKEND=gemini, prefixes large
+# enough for Gemini context caching are stored once and only the suffix is sent.
 
+# Template fields that change per request or round; everything else is the prefix
+REQUEST_FIELDS = ("prompt", "personification_note", "improvement_note", "content")
 
+_llm_fields = getattr(ChatGoogleGenerativeAI, "model_fields", None) or ChatGoogleGenerativeAI.__fields__
+PROVIDER_PROMPT_CACHE = "cached_content" in _llm_fields
+
+prompt_cache = get_prompt_cache()
+if isinstance(prompt_cache, GeminiContextCache) and not PROVIDER_PROMPT_CACHE:
+    print("⚠️  PROMPT_CACHE_BACKEND=gemini needs a langchain-google-genai with cached_content support, "
+          "sending prompt prefixes inline")
+    prompt_cache = PromptPrefixCache()
+
+@lru_cache(maxsize=None)
+def get_templates(platform: str) -> Dict[str, Tuple[PromptTemplate, str]]:
+    """(prefix template, suffix template string) for the generator and critic"""
+    platform_config = PLATFORM_TEMPLATES[platform]
+    templates = {}
+    for role in ("generator", "critic"):
+        prefix, suffix = split_template(platform_config[f"{role}_template"], REQUEST_FIELDS)
+        templates[role] = (PromptTemplate.from_template(prefix), suffix)
+    return templates
+
+@lru_cache(maxsize=None)
+def get_prompt(platform: str, role: str, prefix_cached: bool = False) -> ChatPromptTemplate:
+    """Rendered prefix as the system message and the suffix as the user turn; only the suffix once the provider holds the prefix"""
+    suffix = get_templates(platform)[role][1]
+    messages: List[Tuple[str, str]] = [] if prefix_cached else [("system", "{prefix}")]
+    return ChatPromptTemplate.from_messages(messages + [("human", suffix)])
+
+@lru_cache(maxsize=None)
+def get_chain(platform: str, role: str, key_id: str) -> Runnable:
+    """prompt | llm | text for one platform and role ("generator" or "critic") on one API key"""
+    return get_prompt(platform, role) | llms_by_key[key_id][role] | StrOutputParser()
+
+def run_chain(platform: str, role: str, api_key, inputs: Dict[str, Any], callbacks: Optional[List] = None) -> str:
+    """Invoke one chain with its persona prefix resolved through the prompt cache (blocking)"""
+    prefix = prompt_cache.get(ECHO_MODEL, api_key, get_templates(platform)[role][0].format(**inputs))
+    config = {"callbacks": callbacks} if callbacks else None
+    if prefix.name:
+        llm = llms_by_key[api_key.id][role].bind(cached_content=prefix.name)
+        chain = get_prompt(platform, role, prefix_cached=True) | llm | StrOutputParser()
+        return chain.invoke(inputs, config=config)
+    return get_chain(platform, role, api_key.id).invoke({**inputs, "prefix": prefix.text}, config=config)
+
+for _platform in PLATFORM_TEMPLATES:
+    for _api_key in key_pool.keys:
+        get_chain(_platform, "generator", _api_key.id)
+        get_chain(_platform, "critic", _api_key.id)
+print(f"Chains compiled for {len(PLATFORM_TEMPLATES)} platform(s)")
 
 # --------------- HELPER FUNCTIONS ----------------
-def get_persona_field(field_name: str, default=""):
-    """Safely extract persona fields with fallbacks"""
+def get_persona_field(field_name: str, default="", profile: Optional[Dict[str, Any]] = None):
+    """Safely extract persona fields with fallbacks; profile defaults to the responses.json persona"""
     try:
-        return persona.get("persona", {}).get(field_name, default)
-    except (KeyError, TypeError):
+        if profile is None:
+            profile = persona.get("persona", {})
+        return profile.get(field_name, default)
+    except (KeyError, TypeError, AttributeError):
         return default
 
 def format_list_field(field_list):
@@ -111,6 +349,37 @@ def format_list_field(field_list):
         return ", ".join(field_list) if field_list else "None specified"
     return str(field_list) if field_list else "None specified"
 
+def persona_inputs(profile: Optional[Dict[str, Any]] = None) -> Dict[str, str]:
+    """Persona variables shared by the generator and critic templates"""
+    return {
+        "creator_name": get_persona_field("creator_name", "Content Creator", profile),
+        "tone": get_persona_field("tone", "friendly", profile),
+        "style": get_persona_field("style", "engaging", profile),
+        "catchphrases": format_list_field(get_persona_field("catchphrases", [], profile)),
+        "quirks": format_list_field(get_persona_field("quirks", [], profile)),
+    }
+
+def admit_stream() -> None:
+    """Refuse a new stream up front while an LLM pool has a full queue"""
+    saturated = [executor.name for executor in llm_executors.values() if executor.saturated()]
+    if saturated:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Server busy ({', '.join(saturated)} queue full), retry shortly",
+            headers={"Retry-After": str(ECHO_RETRY_AFTER)}
+        )
+
+async def resolve_persona(user_id: Optional[str]) -> Dict[str, Any]:
+    """Persona for a request: the user's stored persona, or responses.json without a user_id"""
+    if not user_id:
+        return persona.get("persona", {})
+    try:
+        return await persona_store.get(user_id)
+    except PersonaNotFound as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except PersonaUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
 def generate_content_title(platform: str, prompt: str) -> str:
     """Generate a title based on platform and prompt"""
     platform_titles = {
@@ -121,19 +390,78 @@ def generate_content_title(platform: str, prompt: str) -> str:
     }
     return platform_titles.get(platform, f"{platform.title()} Content: {prompt[:50]}...")
 
+def parse_critique(raw: str) -> Critique:
+    """Critic reply as a Critique; prose or malformed JSON falls back to a 0 score with the text as the issue"""
+    cleaned = strip_code_fences(raw)
+    start, end = cleaned.find("{"), cleaned.rfind("}") + 1
+    if 0 <= start < end:
+        try:
+            return Critique(**json.loads(cleaned[start:end]))
+        except (ValueError, TypeError) as e:
+            print(f"Unparseable critique ({e}): {raw[:200]}")
+    return Critique(score=0, issues=[cleaned] if cleaned else [])
+
+def is_approved(critique: Critique, pass_score: float) -> bool:
+    return critique.score >= pass_score
+
+def critique_items(critique: Critique) -> List[str]:
+    """The fixes worth passing on: improvements if the critic gave any, else the issues"""
+    items = [item.strip()[:ECHO_FEEDBACK_CHARS] for item in (critique.improvements or critique.issues)]
+    return [item for item in items if item][:ECHO_FEEDBACK_ITEMS]
+
+def feedback_note(critique: Critique) -> str:
+    """Compact improvement note for the next round instead of the whole critique"""
+    lines = "\n".join(f"- {item}" for item in critique_items(critique))
+    return f"\nIMPROVEMENT NEEDED (scored {critique.score:g}/10):\n{lines}"
+
+def critique_fields(critique: Critique) -> Dict[str, Any]:
+    """Event fields for a critique: a one-line summary plus the structured critique"""
+    items = critique_items(critique)
+    summary = f"Score {critique.score:g}/10" + (": " + " ".join(items) if items else "")
+    return {"critique": summary, **critique.model_dump(exclude_none=True)}
+
+def run_leased_chain(platform: str, role: str, inputs: Dict[str, Any], callbacks: Optional[List] = None) -> str:
+    """
+    run_chain on the least-loaded API key (blocking). The lease is taken in the worker
+    thread, so it lasts exactly as long as the call, even if the awaiting task is cancelled.
+    """
+    with key_pool.lease() as api_key:
+        try:
+            return run_chain(platform, role, api_key, inputs, callbacks)
+        except Exception as e:
+            if is_quota_error(e):
+                key_pool.report_rate_limited(api_key)
+            raise
+
+async def invoke_chain(platform: str, role: str, inputs: Dict[str, Any]) -> str:
+    """Run one precompiled chain on the least-loaded API key in the role's executor"""
+    return await llm_executors[role].run(run_leased_chain, platform, role, inputs)
+
+async def run_draft(platform: str, inputs: Dict[str, Any], index: int) -> tuple:
+    """Generate one draft and critique it: (index, content, critique)"""
+    content = await invoke_chain(platform, "generator", inputs)
+    critique = parse_critique(await invoke_chain(platform, "critic", {**inputs, "content": content}))
+    return index, content, critique
+
 # --------------- STREAMING FUNCTIONS ----------------
-async def stream_content_generation(req: ContentRequest) -> AsyncGenerator[str, None]:
-    """Stream content generation with critic/generator loop"""
+def sse(event: Dict[str, Any]) -> str:
+    """Format one event as a server-sent events frame"""
+    return f"data: {json.dumps(event)}\n\n"
+
+async def content_events(req: ContentRequest, profile: Optional[Dict[str, Any]] = None) -> AsyncGenerator[Dict[str, Any], None]:
+    """Run the critic/generator loop for one platform, yielding progress events"""
     
     if req.platform not in PLATFORM_TEMPLATES:
-        yield f"data: {json.dumps({'error': f'Unsupported platform: {req.platform}'})}\n\n"
+        yield {'error': f'Unsupported platform: {req.platform}'}
         return
     
     platform_config = PLATFORM_TEMPLATES[req.platform]
     max_rounds = req.iterations or 3
+    drafts = req.drafts or 1
+    pass_score = req.pass_score if req.pass_score is not None else ECHO_PASS_SCORE
     
     # Send initial status
-    yield f"data: {json.dumps({'status': 'starting', 'message': f'Starting content generation for {req.platform}...'})}\n\n"
+    yield {'status': 'starting', 'message': f'Starting content generation for {req.platform}...'}
     
     try:
         # Prepare personification note
@@ -143,102 +471,196 @@ async def stream_content_generation(req: ContentRequest) -> AsyncGenerator[str,
         else:
             personification_note = "\nWrite in a professional, engaging style without specific personality quirks."
         
-        # Create prompt templates
-        generator_template = PromptTemplate.from_template(platform_config["generator_template"])
-        critic_template = PromptTemplate.from_template(platform_config["critic_template"])
+        # Template variables that stay the same for every round
+        base_inputs = {
+            **persona_inputs(profile),
+            "prompt": req.prompt.strip(),
+            "personification_note": personification_note,
+        }
         
         content = None
-        critiques = []
+        critiques: List[Critique] = []
+        # Highest-scoring round so far; it is what the request returns
+        best_content, best_critique = None, None
+        stalled = 0
+        final_status = "MAX_ITERATIONS_REACHED"
         
         for i in range(max_rounds):
-            yield f"data: {json.dumps({'status': 'generating', 'iteration': i+1, 'max_iterations': max_rounds})}\n\n"
+            yield {'status': 'generating', 'iteration': i+1, 'max_iterations': max_rounds}
             
             # Prepare improvement note for subsequent iterations
             improvement_note = ""
             if i > 0 and critiques:
-                improvement_note = f"\nIMPROVEMENT NEEDED: {critiques[-1]}"
-            
-            # Create streaming callback handler
-            streaming_handler = StreamingCallbackHandler()
+                improvement_note = feedback_note(critiques[-1])
             
-            # Create generator chain with streaming
-            generator_chain = LLMChain(
-                llm=generator_llm, 
-                prompt=generator_template,
-                callbacks=[streaming_handler]
-            )
+            round_inputs = {**base_inputs, "improvement_note": improvement_note}
             
-            # Stream content generation
-            yield f"data: {json.dumps({'status': 'content_streaming', 'message': 'Generating content...'})}\n\n"
-            
-            # Run generation (this will populate streaming_handler.tokens)
-            content = await asyncio.get_event_loop().run_in_executor(
-                None,
-                lambda: generator_chain.run(
-                    creator_name=get_persona_field("creator_name", "Content Creator"),
-                    tone=get_persona_field("tone", "friendly"),
-                    style=get_persona_field("style", "engaging"),
-                    catchphrases=format_list_field(get_persona_field("catchphrases", [])),
-                    prompt=req.prompt.strip(),
-                    personification_note=personification_note,
-                    improvement_note=improvement_note
-                )
-            )
-            
-            # Stream the generated content token by token
-            if content:
-                for j, char in enumerate(content):
-                    yield f"data: {json.dumps({'type': 'content_token', 'token': char, 'position': j})}\n\n"
-                    await asyncio.sleep(0.01)  # Small delay for streaming effect
+            if drafts > 1:
+                # Best-of-N: draft and critique concurrently, keep the best, stop at the first approval
+                yield {'status': 'drafting', 'drafts': drafts, 'message': f'Generating {drafts} drafts...'}
                 
-                # Send complete content
-                yield f"data: {json.dumps({'type': 'content_complete', 'content': content})}\n\n"
-            
-            # Now get critique
-            yield f"data: {json.dumps({'status': 'critiquing', 'message': 'Getting feedback...'})}\n\n"
-            
-            critic_chain = LLMChain(llm=critic_llm, prompt=critic_template)
-            
-            critique = await asyncio.get_event_loop().run_in_executor(
-                None,
-                lambda: critic_chain.run(
-                    tone=get_persona_field("tone", "friendly"),
-                    style=get_persona_field("style", "engaging"),
-                    catchphrases=format_list_field(get_persona_field("catchphrases", [])),
-                    quirks=format_list_field(get_persona_field("quirks", [])),
-                    content=content
-                )
-            )
+                tasks = [asyncio.create_task(run_draft(req.platform, round_inputs, d)) for d in range(drafts)]
+                best = None
+                failures: List[Exception] = []
+                try:
+                    for next_draft in asyncio.as_completed(tasks):
+                        try:
+                            d, draft_content, draft_critique = await next_draft
+                        except Exception as e:
+                            failures.append(e)
+                            yield {'type': 'draft_failed', 'iteration': i+1, 'error': str(e)}
+                            continue
+                        yield {'type': 'draft_complete', 'iteration': i+1, 'draft': d, 'content': draft_content, **critique_fields(draft_critique)}
+                        if best is None or draft_critique.score > best[2].score:
+                            best = (d, draft_content, draft_critique)
+                        if is_approved(draft_critique, pass_score):
+                            break
+                finally:
+                    # Calls already running in the executor still finish (holding their key
+                    # lease until they do), but nobody waits for them
+                    for task in tasks:
+                        task.cancel()
+                
+                if best is None:
+                    if all(isinstance(e, ExecutorSaturated) for e in failures):
+                        # Keep the busy signal so the client gets retry_after
+                        raise failures[0]
+                    raise Exception(f"All {drafts} drafts failed")
+                
+                _, content, critique = best
+                yield {'type': 'content_complete', 'content': content, 'draft': best[0]}
+            else:
+                # Stream content generation
+                yield {'status': 'content_streaming', 'message': 'Generating content...'}
+                
+                # Forward tokens to the client as the model produces them
+                token_stream = TokenStream()
+                position = 0
+                # Precompiled chain on the least-loaded key; the streaming handler is attached per call
+                async for chunk in token_stream.run(
+                    lambda callbacks: run_leased_chain(req.platform, "generator", round_inputs, callbacks),
+                    llm_executors["generator"]
+                ):
+                    yield {'type': 'content_token', 'token': chunk, 'position': position}
+                    position += len(chunk)
+                
+                content = token_stream.text
+                print(f"Generation round {i+1}: ttfb={token_stream.metrics['ttfb_ms']}ms, "
+                      f"{token_stream.metrics['tokens_per_sec']} tokens/sec")
+                yield {'type': 'stream_metrics', 'iteration': i+1, **token_stream.metrics}
+                
+                if content:
+                    # Send complete content
+                    yield {'type': 'content_complete', 'content': content}
+                
+                # Now get critique
+                yield {'status': 'critiquing', 'message': 'Getting feedback...'}
+                
+                critique = parse_critique(await invoke_chain(req.platform, "critic", {**base_inputs, "content": content}))
             
             critiques.append(critique)
             
             # Send critique
-            yield f"data: {json.dumps({'type': 'critique', 'critique': critique, 'iteration': i+1})}\n\n"
+            yield {'type': 'critique', 'iteration': i+1, **critique_fields(critique)}
+            
+            gain = critique.score - best_critique.score if best_critique is not None else None
+            if best_critique is None or critique.score > best_critique.score:
+                best_content, best_critique = content, critique
             
             # Check if approved
-            if "APPROVED" in critique.upper():
-                yield f"data: {json.dumps({'status': 'approved', 'iterations': i+1, 'message': f'Content approved after {i+1} iterations!'})}\n\n"
+            if is_approved(critique, pass_score):
+                final_status = "APPROVED"
+                yield {'status': 'approved', 'iterations': i+1, 'message': f'Content approved after {i+1} iterations!'}
+                break
+            
+            # Another round is unlikely to help once the score stops improving
+            stalled = stalled + 1 if gain is not None and gain < ECHO_PLATEAU_DELTA else 0
+            if stalled >= ECHO_PLATEAU_ROUNDS and i < max_rounds - 1:
+                final_status = "PLATEAU"
+                yield {'status': 'plateau', 'iterations': i+1, 'score': best_critique.score,
+                       'message': f'Score stopped improving at {best_critique.score:g}/10, keeping the best version'}
                 break
             elif i < max_rounds - 1:
-                yield f"data: {json.dumps({'status': 'improving', 'message': 'Improving content based on feedback...'})}\n\n"
+                yield {'status': 'improving', 'message': 'Improving content based on feedback...'}
         
         # Final result
-        final_status = "APPROVED" if "APPROVED" in critiques[-1].upper() else "MAX_ITERATIONS_REACHED"
+        outcome = {
+            "APPROVED": f" (Approved after {len(critiques)} iterations)",
+            "PLATEAU": f" (Score plateaued after {len(critiques)} iterations)",
+        }.get(final_status, f" (Max iterations reached: {len(critiques)})")
         
         response_content = {
             "title": generate_content_title(req.platform, req.prompt),
             "type": platform_config["type"],
-            "description": f"Generated {req.platform} content for: {req.prompt[:100]}..." + 
-                          (f" (Approved after {len(critiques)} iterations)" if final_status == "APPROVED" else 
-                          f" (Max iterations reached: {len(critiques)})"),
-            "content": content.strip(),
+            "description": f"Generated {req.platform} content for: {req.prompt[:100]}..." + outcome,
+            "content": best_content.strip(),
             "platform": req.platform
         }
         
-        yield f"data: {json.dumps({'type': 'final_result', 'content': response_content, 'status': final_status, 'iterations': len(critiques), 'critiques': critiques})}\n\n"
+        yield {'type': 'final_result', 'content': response_content, 'status': final_status, 'iterations': len(critiques),
+               'score': best_critique.score, 'critiques': [c.model_dump(exclude_none=True) for c in critiques]}
         
+    except ExecutorSaturated as e:
+        # Started before the pools filled up; the client can retry like a 503
+        yield {'error': f'Server busy: {e}', 'retry_after': ECHO_RETRY_AFTER}
     except Exception as e:
-        yield f"data: {json.dumps({'error': str(e)})}\n\n"
+        yield {'error': str(e)}
+
+async def stream_content_generation(req: ContentRequest, profile: Dict[str, Any]) -> AsyncGenerator[str, None]:
+    """Stream content generation with critic/generator loop"""
+    async for event in content_events(req, profile):
+        yield sse(event)
+
+async def stream_multi_platform_generation(req: MultiPlatformRequest, profile: Dict[str, Any]) -> AsyncGenerator[str, None]:
+    """
+    Run the critic/generator loop for several platforms concurrently and multiplex
+    their events onto one stream, each tagged with its platform
+    """
+    platforms = list(dict.fromkeys(req.platforms))
+    queue: asyncio.Queue = asyncio.Queue()
+    slots = asyncio.Semaphore(ECHO_FANOUT_CONCURRENCY)
+    done = object()
+    
+    async def run_platform(platform: str):
+        final_status = "FAILED"
+        try:
+            async with slots:
+                platform_req = ContentRequest(
+                    platform=platform,
+                    prompt=req.prompt,
+                    personify=req.personify,
+                    iterations=req.iterations,
+                    drafts=req.drafts,
+                    user_id=req.user_id,
+                    pass_score=req.pass_score
+                )
+                async for event in content_events(platform_req, profile):
+                    if event.get("type") == "final_result":
+                        final_status = event["status"]
+                    await queue.put({"platform": platform, **event})
+        except Exception as e:
+            await queue.put({"platform": platform, "error": str(e)})
+        finally:
+            await queue.put((done, platform, final_status))
+    
+    yield sse({'status': 'starting', 'platforms': platforms, 'message': f'Starting content generation for {len(platforms)} platforms...'})
+    
+    tasks = [asyncio.create_task(run_platform(platform)) for platform in platforms]
+    results: Dict[str, str] = {}
+    try:
+        while len(results) < len(tasks):
+            event = await queue.get()
+            if isinstance(event, tuple) and event[0] is done:
+                results[event[1]] = event[2]
+                yield sse({'type': 'platform_complete', 'platform': event[1], 'status': event[2]})
+                continue
+            yield sse(event)
+        
+        yield sse({'type': 'multi_complete', 'results': results})
+    finally:
+        # Client went away: stop the platforms that are still running
+        for task in tasks:
+            task.cancel()
 
 # --------------- ROUTES ----------------
 @app.get("/")
@@ -252,9 +674,9 @@ async def root():
     }
 
 @app.get("/persona")
-async def get_persona():
-    """Get current persona configuration"""
-    return {"persona": persona.get("persona", {})}
+async def get_persona(user_id: Optional[str] = None):
+    """Get the persona used for a user, or the default persona configuration"""
+    return {"user_id": user_id, "persona": await resolve_persona(user_id)}
 
 # Global OPTIONS handler for all routes
 @app.options("/{path:path}")
@@ -283,8 +705,52 @@ async def generate_content_stream(req: ContentRequest):
     if max_rounds < 1 or max_rounds > 10:
         raise HTTPException(status_code=400, detail="Iterations must be between 1 and 10")
     
+    if not 1 <= (req.drafts or 1) <= ECHO_MAX_DRAFTS:
+        raise HTTPException(status_code=400, detail=f"Drafts must be between 1 and {ECHO_MAX_DRAFTS}")
+    
+    admit_stream()
+    profile = await resolve_persona(req.user_id)
+    
     return StreamingResponse(
-        stream_content_generation(req),
+        stream_content_generation(req, profile),
+        media_type="text/plain",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "Access-Control-Allow-Origin": "*",
+            "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
+            "Access-Control-Allow-Headers": "Content-Type",
+        }
+    )
+
+@app.post("/generate-stream/multi")
+async def generate_multi_platform_stream(req: MultiPlatformRequest):
+    """Generate content for several platforms at once on one multiplexed stream"""
+    if not req.prompt.strip():
+        raise HTTPException(status_code=400, detail="Prompt cannot be empty")
+    
+    if not req.platforms:
+        raise HTTPException(status_code=400, detail="At least one platform is required")
+    
+    unsupported = [platform for platform in req.platforms if platform not in PLATFORM_TEMPLATES]
+    if unsupported:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported platforms: {unsupported}. Supported platforms: {list(PLATFORM_TEMPLATES.keys())}"
+        )
+    
+    max_rounds = req.iterations or 3
+    if max_rounds < 1 or max_rounds > 10:
+        raise HTTPException(status_code=400, detail="Iterations must be between 1 and 10")
+    
+    if not 1 <= (req.drafts or 1) <= ECHO_MAX_DRAFTS:
+        raise HTTPException(status_code=400, detail=f"Drafts must be between 1 and {ECHO_MAX_DRAFTS}")
+    
+    admit_stream()
+    profile = await resolve_persona(req.user_id)
+    
+    return StreamingResponse(
+        stream_multi_platform_generation(req, profile),
         media_type="text/plain",
         headers={
             "Cache-Control": "no-cache",
@@ -339,12 +805,25 @@ async def get_supported_platforms():
         ]
     }
 
+@app.get("/metrics")
+async def get_metrics():
+    """Get streaming latency and throughput metrics"""
+    return {
+        "streaming": stream_metrics.snapshot(),
+        "rate_limiter": rate_limiter.snapshot(),
+        "api_keys": key_pool.snapshot(),
+        "prompt_cache": prompt_cache.stats(),
+        "persona_cache": persona_store.stats(),
+        "executors": {role: executor.snapshot() for role, executor in llm_executors.items()}
+    }
+
 @app.get("/health")
 async def health_check():
     return {
         "status": "healthy", 
-        "google_api_key_set": bool(GOOGLE_API_KEY),
+        "google_api_key_set": bool(key_pool.keys),
         "persona_loaded": bool(persona),
+        "mongodb_connected": datastore.mongo is not None,
         "supported_platforms": len(PLATFORM_TEMPLATES),
         "cors_configured": True,
         "streaming_enabled": True
@@ -1,4 +1,4 @@
-from typing import List, Optional
+from typing import List, Literal, Optional
 from pydantic import BaseModel, Field
 
 class Persona(BaseModel):
@@ -14,11 +14,17 @@ class Persona(BaseModel):
 class PersonaExtractRequest(BaseModel):
     creator_content: str
 
+class Edit(BaseModel):
+    id: str  # section ID, e.g. "P3"
+    op: str = "replace"  # "replace", "insert_after" or "delete"; others are skipped
+    text: Optional[str] = None
+
 class Critique(BaseModel):
     score: float = Field(ge=0, le=10)
     issues: List[str] = Field(default_factory=list)
     improvements: List[str] = Field(default_factory=list)
-    partial_rewrite: str
+    partial_rewrite: Optional[str] = None
+    edits: List[Edit] = Field(default_factory=list)
 
 class GenerateRequest(BaseModel):
     topic: str
@@ -28,6 +34,8 @@ class GenerateRequest(BaseModel):
     words_max: int = 700
     max_iters: int = 3
     pass_score: float = 8.0
+    # "edits": the critic patches paragraphs in place; "rewrite": regenerate the whole script each round
+    refine_mode: Literal["edits", "rewrite"] = "edits"
 
 class GenerateResponse(BaseModel):
     final_script: str
@@ -38,6 +46,9 @@ class ContentRequest(BaseModel):
     prompt: str
     personify: Optional[bool] = False
     iterations: Optional[int] = 3
+    drafts: Optional[int] = 1  # >1: best-of-N drafts per round, critiqued concurrently
+    user_id: Optional[str] = None  # stored persona to write as; responses.json when omitted
+    pass_score: Optional[float] = Field(None, ge=0, le=10)  # critic score that ends the loop; ECHO_PASS_SCORE when omitted
     
     class Config:
         schema_extra = {
@@ -49,6 +60,25 @@ class ContentRequest(BaseModel):
             }
         }
 
+class MultiPlatformRequest(BaseModel):
+    platforms: List[str]
+    prompt: str
+    personify: Optional[bool] = False
+    iterations: Optional[int] = 3
+    drafts: Optional[int] = 1
+    user_id: Optional[str] = None
+    pass_score: Optional[float] = Field(None, ge=0, le=10)
+    
+    class Config:
+        schema_extra = {
+            "example": {
+                "platforms": ["youtube", "instagram", "twitter", "linkedin"],
+                "prompt": "How to make the perfect cup of coffee at home",
+                "personify": True,
+                "iterations": 3
+            }
+        }
+
 class SaveOutputRequest(BaseModel):
     title: str
     type: str
@@ -1,13 +1,16 @@
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 from typing import List, Optional, Dict, Any
-import redis
 import os
 import json
-from pymongo import MongoClient
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_community.vectorstores import FAISS
-from langchain_huggingface import HuggingFaceEmbeddings
+from services.embeddings import get_embeddings
+from services.vectorstore import UserIndexStore
+from services.datastore import DataStore
+from services.executors import BoundedExecutor
+from services.embedding_cache import get_cached_embeddings
+from services.persona_store import publish_persona_invalidation
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.chains import RetrievalQA
 from langchain_core.prompts import PromptTemplate
@@ -31,48 +34,27 @@ class PersonaResponse(BaseModel):
     processed_videos: int
     total_tokens: Optional[int] = None
 
-# Redis connection with error handling
-try:
-    redis_client = redis.Redis(
-        host=os.getenv("REDIS_HOST", "127.0.0.1"),
-        port=int(os.getenv("REDIS_PORT", 6379)),
-        password=os.getenv("REDIS_PASSWORD", None),
-        decode_responses=True,
-        socket_connect_timeout=5,
-        socket_timeout=5
-    )
-    # Test connection
-    redis_client.ping()
-    logger.info("✅ Redis connected successfully")
-except Exception as e:
-    logger.error(f"❌ Redis connection failed: {e}")
-    redis_client = None
+# Pooled async Redis + MongoDB clients, opened on startup
+datastore = DataStore()
 
-# MongoDB connection with error handling
-try:
-    mongo_client = MongoClient(
-        os.getenv("MONGO_URI"),
-        serverSelectionTimeoutMS=5000,
-        tls=True,
-        tlsAllowInvalidCertificates=True  # Allow invalid certificates for development
-    )
-    # Test connection
-    mongo_client.server_info()
-    db = mongo_client[os.getenv("DB_NAME", "UserData")]
-    users_collection = db["users"]
-    logger.info("✅ MongoDB connected successfully")
-except Exception as e:
-    logger.error(f"❌ MongoDB connection failed: {e}")
-    mongo_client = None
+# Bounded pool for CPU-heavy embedding, index and retrieval work, so it never
+# runs on the event loop
+EMBEDDING_EXECUTOR_WORKERS = int(os.getenv("EMBEDDING_EXECUTOR_WORKERS", "2"))
+embedding_executor = BoundedExecutor("embedding", EMBEDDING_EXECUTOR_WORKERS)
+
+@app.on_event("startup")
+async def startup():
+    await datastore.connect()
+
+@app.on_event("shutdown")
+async def shutdown():
+    await datastore.close()
+    embedding_executor.shutdown()
 
 # Initialize LangChain components with HuggingFace embeddings and Gemini Flash 2.0
 try:
-    # Using HuggingFace embeddings - free and high quality
-    embeddings = HuggingFaceEmbeddings(
-        model_name="sentence-transformers/all-MiniLM-L6-v2",  # Fast, good quality, free
-        model_kwargs={'device': 'cpu'},  # Use 'cuda' if you have GPU
-        encode_kwargs={'normalize_embeddings': True}
-    )
+    # Shared HuggingFace embedding engine - loaded once per process
+    embeddings = get_embeddings()
     
     # Using a simple rule-based persona extractor instead of Google API
     from langchain_core.runnables import Runnable
@@ -129,30 +111,36 @@ def process_transcripts_to_context(transcripts: List[TranscriptItem]) -> str:
         context_parts.append(f"Video ID: {item.videoId}\n{item.transcript}\n---\n")
     return "\n".join(context_parts)
 
-def create_vector_store(transcripts: List[TranscriptItem]) -> FAISS:
-    """Create a FAISS vector store from transcripts for RAG"""
+# Split text into chunks for better embedding (optimized for speed)
+text_splitter = RecursiveCharacterTextSplitter(
+    chunk_size=500,  # Smaller chunks for faster processing
+    chunk_overlap=100,  # Reduced overlap
+    length_function=len
+)
+
+def split_transcript(video_id: str, transcript: str) -> List[str]:
+    """Split one transcript into embedding chunks; unchanged videos always give the same chunks"""
+    return text_splitter.split_text(f"Video {video_id}: {transcript}")
+
+# Per-user FAISS indexes persisted on disk; chunk vectors come from the embedding cache
+user_indexes = UserIndexStore(split_fn=split_transcript, embedding=get_cached_embeddings())
+
+def update_vector_store(userId: str, video_ids: List[str], transcripts: List[TranscriptItem]) -> Optional[FAISS]:
+    """Sync the user's persistent FAISS index with their current transcripts for RAG"""
     try:
-        # Combine all transcripts into documents
-        documents = []
-        for item in transcripts:
-            documents.append(f"Video {item.videoId}: {item.transcript}")
-        
-        # Split text into chunks for better embedding (optimized for speed)
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=500,  # Smaller chunks for faster processing
-            chunk_overlap=100,  # Reduced overlap
-            length_function=len
+        cached_embeddings = get_cached_embeddings()
+        hits_before = cached_embeddings.cache.hits
+        vector_store = user_indexes.sync(
+            userId,
+            video_ids,
+            {item.videoId: item.transcript for item in transcripts}
         )
-        
-        texts = text_splitter.split_text("\n\n".join(documents))
-        
-        # Create vector store
-        vector_store = FAISS.from_texts(texts, embeddings)
-        logger.info(f"✅ Created vector store with {len(texts)} chunks")
+        cache_hits = cached_embeddings.cache.hits - hits_before
+        logger.info(f"✅ Vector store ready: {len(transcripts)} transcripts synced ({cache_hits} chunks from embedding cache)")
         return vector_store
         
     except Exception as e:
-        logger.error(f"❌ Error creating vector store: {e}")
+        logger.error(f"❌ Error updating vector store: {e}")
         raise
 
 def get_persona_extraction_chain(vector_store: FAISS):
@@ -279,8 +267,10 @@ async def health_check():
     """Health check endpoint"""
     return {
         "status": "healthy",
-        "redis_connected": redis_client is not None,
-        "mongodb_connected": mongo_client is not None,
+        "redis_connected": datastore.redis is not None,
+        "mongodb_connected": datastore.mongo is not None,
+        "embedding_executor": embedding_executor.snapshot(),
+        "embedding_cache": get_cached_embeddings().cache.stats(),
         "timestamp": datetime.utcnow().isoformat()
     }
 
@@ -288,50 +278,42 @@ async def health_check():
 async def extract_persona_from_redis(userId: str):
     """Extract persona from cached transcripts in Redis"""
     
-    if not redis_client:
+    if datastore.redis is None:
         raise HTTPException(status_code=503, detail="Redis service unavailable")
     
-    if not mongo_client:
+    if datastore.mongo is None:
         raise HTTPException(status_code=503, detail="MongoDB service unavailable")
     
     try:
         logger.info(f"🔍 Starting persona extraction for user: {userId}")
         
-        # 1. Get all transcript keys for this user
-        keys = redis_client.keys(f"transcript:{userId}:*")
-        if not keys:
+        # 1. Get all cached video IDs for this user
+        video_ids = await datastore.transcripts.list_video_ids(userId)
+        if not video_ids:
             raise HTTPException(
                 status_code=404, 
                 detail=f"No transcripts found in Redis for user: {userId}"
             )
         
-        logger.info(f"📚 Found {len(keys)} transcripts for user {userId}")
+        logger.info(f"📚 Found {len(video_ids)} transcripts for user {userId}")
         
-        # 2. Fetch transcripts from Redis
-        transcripts = []
-        for key in keys:
-            try:
-                transcript_text = redis_client.get(key)
-                if transcript_text:
-                    videoId = key.split(":")[2]
-                    transcripts.append(TranscriptItem(
-                        videoId=videoId, 
-                        transcript=transcript_text
-                    ))
-            except Exception as e:
-                logger.warning(f"⚠️ Error fetching transcript {key}: {e}")
-                continue
+        # 2. Fetch the transcripts; the index only re-embeds new or changed ones (by content hash)
+        fetched = await datastore.transcripts.fetch(userId, video_ids)
+        transcripts = [
+            TranscriptItem(videoId=videoId, transcript=transcript_text)
+            for videoId, transcript_text in fetched.items()
+        ]
+        
+        logger.info(f"✅ Loaded {len(transcripts)} transcripts")
         
-        if not transcripts:
+        # 3. Update the user's vector store for RAG
+        vector_store = await embedding_executor.run(update_vector_store, userId, video_ids, transcripts)
+        if vector_store is None:
             raise HTTPException(
                 status_code=404, 
                 detail="No valid transcripts found"
             )
-        
-        logger.info(f"✅ Successfully loaded {len(transcripts)} transcripts")
-        
-        # 3. Create vector store for RAG
-        vector_store = create_vector_store(transcripts)
+        processed_videos = len(await embedding_executor.run(user_indexes.indexed_videos, userId))
         
         # 4. Create and run persona extraction chain
         chain = get_persona_extraction_chain(vector_store)
@@ -339,7 +321,7 @@ async def extract_persona_from_redis(userId: str):
         question = "Extract a comprehensive persona profile from this content, focusing on communication style, themes, personality, and engagement patterns."
         
         logger.info("🤖 Running HuggingFace + Gemini Flash 2.0 persona extraction...")
-        result = chain.invoke({"query": question})
+        result = await embedding_executor.run(chain.invoke, {"query": question})
         
         # Gemini returns result differently - extract the response
         if isinstance(result, dict) and 'result' in result:
@@ -352,7 +334,7 @@ async def extract_persona_from_redis(userId: str):
         
         # 6. Save to MongoDB with error handling - matching userModel.js structure
         try:
-            result = users_collection.update_one(
+            result = await datastore.users.update_one(
                 {"_id": userId},
                 {
                     "$set": {
@@ -365,6 +347,8 @@ async def extract_persona_from_redis(userId: str):
             
             if result.modified_count > 0 or result.upserted_id:
                 logger.info(f"✅ Persona saved to MongoDB for user {userId}")
+                # cre8echo workers drop their cached copy
+                await publish_persona_invalidation(datastore.redis, userId)
             else:
                 logger.warning(f"⚠️ No changes made to MongoDB for user {userId}")
                 
@@ -375,7 +359,7 @@ async def extract_persona_from_redis(userId: str):
         return PersonaResponse(
             persona=persona_data,
             message="Persona extracted and saved successfully",
-            processed_videos=len(transcripts)
+            processed_videos=processed_videos
         )
         
     except HTTPException:
@@ -388,11 +372,11 @@ async def extract_persona_from_redis(userId: str):
 async def get_user_persona(userId: str):
     """Retrieve stored persona for a user"""
     
-    if not mongo_client:
+    if datastore.mongo is None:
         raise HTTPException(status_code=503, detail="MongoDB service unavailable")
     
     try:
-        user_data = users_collection.find_one({"_id": userId})
+        user_data = await datastore.users.find_one({"_id": userId})
         
         if not user_data or "persona" not in user_data:
             raise HTTPException(
@@ -419,23 +403,27 @@ async def delete_user_persona(userId: str):
     
     try:
         # Delete from MongoDB
-        if mongo_client:
-            result = users_collection.delete_one({"_id": userId})
+        if datastore.mongo is not None:
+            result = await datastore.users.delete_one({"_id": userId})
             mongo_deleted = result.deleted_count > 0
+            if mongo_deleted:
+                await publish_persona_invalidation(datastore.redis, userId)
         else:
             mongo_deleted = False
         
         # Delete transcripts from Redis
         redis_deleted = 0
-        if redis_client:
-            keys = redis_client.keys(f"transcript:{userId}:*")
-            if keys:
-                redis_deleted = redis_client.delete(*keys)
+        if datastore.transcripts is not None:
+            redis_deleted = await datastore.transcripts.delete_user(userId)
+        
+        # Delete the user's persisted vector index
+        index_deleted = await embedding_executor.run(user_indexes.delete, userId)
         
         return {
             "message": f"Cleanup completed for user {userId}",
             "mongodb_deleted": mongo_deleted,
-            "redis_transcripts_deleted": redis_deleted
+            "redis_transcripts_deleted": redis_deleted,
+            "vector_index_deleted": index_deleted
         }
         
     except Exception as e:
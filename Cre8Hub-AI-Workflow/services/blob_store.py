@@ -0,0 +1,129 @@
+import os
+import re
+import asyncio
+import hashlib
+import mimetypes
+import threading
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+BLOB_STORE_DIR = os.getenv("BLOB_STORE_DIR", "cache/blobs")
+BLOB_STORE_MAX_MB = float(os.getenv("BLOB_STORE_MAX_MB", "1024"))
+
+# Blob ids are "<sha256>.<ext>"; anything else never touches the filesystem
+_BLOB_ID = re.compile(r"^[0-9a-f]{64}\.[a-z0-9]+$")
+
+
+def blob_id(data: bytes, mime_type: str) -> str:
+    """Content address of a blob: sha256 of its bytes plus an extension for its type"""
+    extension = (mimetypes.guess_extension(mime_type) or ".bin").lstrip(".")
+    return f"{hashlib.sha256(data).hexdigest()}.{extension}"
+
+
+class BlobStore:
+    """Content-addressed files on local disk with size-based LRU eviction"""
+
+    def __init__(self, root: str = BLOB_STORE_DIR, max_bytes: int = int(BLOB_STORE_MAX_MB * 1024 * 1024)):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        self.total_bytes = sum(
+            os.path.getsize(os.path.join(directory, name))
+            for directory, _, names in os.walk(root)
+            for name in names
+        )
+
+    def _path(self, blob: str) -> str:
+        return os.path.join(self.root, blob[:2], blob)
+
+    def put(self, data: bytes, mime_type: str) -> str:
+        """Store data (a no-op if identical bytes are already stored) and return its id"""
+        blob = blob_id(data, mime_type)
+        path = self._path(blob)
+        if os.path.exists(path):
+            os.utime(path)
+            return blob
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write under a unique name and rename, so readers never see a partial file
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self.total_bytes += len(data)
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+        return blob
+
+    async def aput(self, data: bytes, mime_type: str) -> str:
+        """put() on the default executor, so hashing, the write and any eviction stay off the event loop"""
+        return await asyncio.get_running_loop().run_in_executor(None, self.put, data, mime_type)
+
+    def get(self, blob: str) -> Optional[Tuple[str, str]]:
+        """(file path, MIME type) for a stored blob, or None if it is unknown or evicted"""
+        if not _BLOB_ID.match(blob):
+            return None
+        path = self._path(blob)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path, mimetypes.guess_type(blob)[0] or "application/octet-stream"
+
+    def _evict(self) -> None:
+        """Delete least recently used blobs until the store is back under 90% of its limit"""
+        files = []
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        files.sort()
+        target = self.max_bytes * 0.9
+        self.total_bytes = sum(size for _, size, _ in files)
+        for _, size, path in files:
+            if self.total_bytes <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.total_bytes -= size
+            self.evictions += 1
+        logger.info(f"🧹 Blob store evicted down to {self.total_bytes / 1024 / 1024:.1f} MB")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "root": self.root,
+            "size_mb": round(self.total_bytes / 1024 / 1024, 1),
+            "max_size_mb": round(self.max_bytes / 1024 / 1024, 1),
+            "evictions": self.evictions,
+        }
+
+
+_store: Optional[BlobStore] = None
+_store_lock = threading.Lock()
+
+
+def get_blob_store() -> BlobStore:
+    """Return the process-wide blob store"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = BlobStore()
+    return _store
+
+
+__all__ = [
+    "BlobStore",
+    "blob_id",
+    "get_blob_store",
+]
@@ -1,14 +1,13 @@
 import os
-from langchain_community.embeddings import HuggingFaceEmbeddings
 from langchain_core.prompts import PromptTemplate
 from langchain.chains import RetrievalQA
 from langchain.chains import LLMChain
 from langchain.schema import Document
-from langchain_community.vectorstores import FAISS
 import logging
 from dotenv import load_dotenv
 from langchain_google_genai import ChatGoogleGenerativeAI
 from typing import List, Optional
+from services.rate_limiter import get_rate_limiter, RateLimitCallbackHandler
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
@@ -28,14 +27,9 @@ def get_chain(transcripts: Optional[List[str]] = None):
                 )
                 docs.append(doc)
             
-            # Create embeddings and vector store
-            embeddings = HuggingFaceEmbeddings(
-                model_name="all-MiniLM-L6-v2",
-                model_kwargs={"device": "cpu"}
-            )
-            
-            # Create FAISS index from documents
-            vectorstore = FAISS.from_documents(docs, embeddings)
+            # Create FAISS index from documents with the shared embedding model
+            from services.vectorstore import from_documents
+            vectorstore = from_documents(docs)
             retriever = vectorstore.as_retriever(search_type="similarity", search_kwargs={"k": len(docs)})
             
         else:
@@ -186,25 +180,73 @@ EVALUATE and return EXACTLY this JSON:
 }}
 """
 
+EDIT_CRITIC_PROMPT = """\
+You are a strict persona critic. Compare the script to the persona and output STRICT JSON ONLY.
+
+PERSONA:
+- Tone: {tone}
+- Style: {style}
+- Pacing: {pacing}
+- Humor: {humor}
+- Audience: {audience}
+- Catchphrases: {catchphrases}
+- Signature Patterns: {signature_patterns}
+
+SCRIPT (every paragraph starts with its ID):
+\"\"\"{sections}\"\"\"
+
+EVALUATE and return EXACTLY this JSON:
+{{
+  "score": 7.5,
+  "issues": ["..."],
+  "improvements": ["..."],
+  "edits": [
+    {{"id": "P2", "op": "replace", "text": "..."}},
+    {{"id": "P4", "op": "insert_after", "text": "..."}},
+    {{"id": "P5", "op": "delete"}}
+  ]
+}}
+
+EDIT RULES:
+- Only include paragraphs that must change; every paragraph you leave out is kept as is.
+- "text" is the complete new paragraph, without the [P#] ID.
+- IDs refer to the script above; do not renumber after your own edits.
+- Return an empty "edits" list when the script already fits the persona.
+"""
+
 GEN_MODEL = os.getenv("GEN_MODEL", "gemini-1.5-flash")
 CRITIC_MODEL = os.getenv("CRITIC_MODEL", "gemini-1.5-pro")
 
-# LLMs
-generator_llm = ChatGoogleGenerativeAI(model=GEN_MODEL, temperature=0.7)
-critic_llm = ChatGoogleGenerativeAI(model=CRITIC_MODEL, temperature=0.2)
+# LLMs - both acquire from the shared rate limiter before each call, which also
+# covers services/loop's direct generator_chain.llm.invoke
+GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+rate_limiter = get_rate_limiter()
+generator_llm = ChatGoogleGenerativeAI(
+    model=GEN_MODEL,
+    temperature=0.7,
+    callbacks=[RateLimitCallbackHandler(rate_limiter, GEN_MODEL, GOOGLE_API_KEY)]
+)
+critic_llm = ChatGoogleGenerativeAI(
+    model=CRITIC_MODEL,
+    temperature=0.2,
+    callbacks=[RateLimitCallbackHandler(rate_limiter, CRITIC_MODEL, GOOGLE_API_KEY)]
+)
 
 # Prompts
 generator_tmpl = PromptTemplate.from_template(GENERATOR_PROMPT)
 critic_tmpl = PromptTemplate.from_template(CRITIC_PROMPT)
+edit_critic_tmpl = PromptTemplate.from_template(EDIT_CRITIC_PROMPT)
 
 # Chains
 generator_chain = LLMChain(llm=generator_llm, prompt=generator_tmpl, verbose=False)
 critic_chain = LLMChain(llm=critic_llm, prompt=critic_tmpl, verbose=False)
+edit_critic_chain = LLMChain(llm=critic_llm, prompt=edit_critic_tmpl, verbose=False)
 
 __all__ = [
     "get_chain",
     "generator_chain",
     "critic_chain",
+    "edit_critic_chain",
     "GEN_MODEL",
     "CRITIC_MODEL",
 ]
@@ -253,8 +295,10 @@ EVALUATION CRITERIA:
 5. Does it have a clear call-to-action?
 
 RESPONSE FORMAT:
-- If the script meets all criteria well, respond: "APPROVED"
-- If improvements needed, provide specific, actionable feedback in 2-3 sentences
+Reply with JSON only, no other text:
+{{"score": <0-10, how well the script meets the criteria>, "issues": ["<problem>"], "improvements": ["<specific, actionable fix>"]}}
+- At most 3 issues and 3 improvements, one short sentence each
+- Empty lists if nothing needs to change
 
 Your evaluation:"""
     },
@@ -301,8 +345,10 @@ EVALUATION CRITERIA:
 5. Is there a clear call-to-action?
 
 RESPONSE FORMAT:
-- If the content meets all criteria well, respond: "APPROVED"
-- If improvements needed, provide specific, actionable feedback in 2-3 sentences
+Reply with JSON only, no other text:
+{{"score": <0-10, how well the content meets the criteria>, "issues": ["<problem>"], "improvements": ["<specific, actionable fix>"]}}
+- At most 3 issues and 3 improvements, one short sentence each
+- Empty lists if nothing needs to change
 
 Your evaluation:"""
     },
@@ -350,8 +396,10 @@ EVALUATION CRITERIA:
 5. Is there a clear call-to-action at the end?
 
 RESPONSE FORMAT:
-- If the content meets all criteria well, respond: "APPROVED"
-- If improvements needed, provide specific, actionable feedback in 2-3 sentences
+Reply with JSON only, no other text:
+{{"score": <0-10, how well the content meets the criteria>, "issues": ["<problem>"], "improvements": ["<specific, actionable fix>"]}}
+- At most 3 issues and 3 improvements, one short sentence each
+- Empty lists if nothing needs to change
 
 Your evaluation:"""
     },
@@ -399,8 +447,10 @@ EVALUATION CRITERIA:
 5. Is there a clear, professional call-to-action?
 
 RESPONSE FORMAT:
-- If the content meets all criteria well, respond: "APPROVED"
-- If improvements needed, provide specific, actionable feedback in 2-3 sentences
+Reply with JSON only, no other text:
+{{"score": <0-10, how well the content meets the criteria>, "issues": ["<problem>"], "improvements": ["<specific, actionable fix>"]}}
+- At most 3 issues and 3 improvements, one short sentence each
+- Empty lists if nothing needs to change
 
 Your evaluation:"""
     }
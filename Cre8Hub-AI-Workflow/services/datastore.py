@@ -0,0 +1,77 @@
+import os
+import logging
+from typing import Optional
+import redis.asyncio as aioredis
+from motor.motor_asyncio import AsyncIOMotorClient
+from services.transcripts import TranscriptStore
+
+logger = logging.getLogger(__name__)
+
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+REDIS_TIMEOUT = float(os.getenv("REDIS_TIMEOUT", "5"))
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_TIMEOUT_MS = int(os.getenv("MONGO_TIMEOUT_MS", "5000"))
+
+
+class DataStore:
+    """Pooled async Redis and MongoDB clients shared by every request in the worker"""
+
+    def __init__(self):
+        self.redis: Optional[aioredis.Redis] = None
+        self.mongo: Optional[AsyncIOMotorClient] = None
+        self.users = None
+        self.transcripts: Optional[TranscriptStore] = None
+
+    async def connect(self) -> None:
+        """Open both pools; a backend that cannot be reached is left as None"""
+        try:
+            pool = aioredis.ConnectionPool(
+                host=os.getenv("REDIS_HOST", "127.0.0.1"),
+                port=int(os.getenv("REDIS_PORT", 6379)),
+                password=os.getenv("REDIS_PASSWORD", None),
+                decode_responses=True,
+                max_connections=REDIS_MAX_CONNECTIONS,
+                socket_connect_timeout=REDIS_TIMEOUT,
+                socket_timeout=REDIS_TIMEOUT
+            )
+            client = aioredis.Redis(connection_pool=pool)
+            await client.ping()
+            self.redis = client
+            self.transcripts = TranscriptStore(client)
+            logger.info(f"✅ Redis connected successfully (pool size {REDIS_MAX_CONNECTIONS})")
+        except Exception as e:
+            logger.error(f"❌ Redis connection failed: {e}")
+            self.redis = None
+            self.transcripts = None
+
+        try:
+            client = AsyncIOMotorClient(
+                os.getenv("MONGO_URI"),
+                maxPoolSize=MONGO_MAX_POOL_SIZE,
+                minPoolSize=MONGO_MIN_POOL_SIZE,
+                serverSelectionTimeoutMS=MONGO_TIMEOUT_MS,
+                connectTimeoutMS=MONGO_TIMEOUT_MS,
+                socketTimeoutMS=MONGO_TIMEOUT_MS,
+                tls=True,
+                tlsAllowInvalidCertificates=True  # Allow invalid certificates for development
+            )
+            await client.admin.command("ping")
+            self.mongo = client
+            self.users = client[os.getenv("DB_NAME", "UserData")]["users"]
+            logger.info(f"✅ MongoDB connected successfully (pool size {MONGO_MAX_POOL_SIZE})")
+        except Exception as e:
+            logger.error(f"❌ MongoDB connection failed: {e}")
+            self.mongo = None
+            self.users = None
+
+    async def close(self) -> None:
+        if self.redis is not None:
+            await self.redis.aclose()
+        if self.mongo is not None:
+            self.mongo.close()
+
+
+__all__ = [
+    "DataStore",
+]
@@ -0,0 +1,172 @@
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+import logging
+from typing import Dict, List, Optional
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from services.embeddings import EmbeddingEngine, get_embeddings
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "cache/embeddings.sqlite3")
+EMBEDDING_CACHE_MAX_MB = float(os.getenv("EMBEDDING_CACHE_MAX_MB", "512"))
+
+# SQLite limits the number of bound parameters per statement
+_SQL_BATCH = 500
+
+
+def chunk_key(model_name: str, text: str) -> str:
+    """Content address of a chunk embedding: hash of model name + chunk text"""
+    return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Persistent chunk-embedding store with size-based LRU eviction"""
+
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH, max_bytes: int = int(EMBEDDING_CACHE_MAX_MB * 1024 * 1024)):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS chunks_last_access ON chunks(last_access)")
+        self._conn.commit()
+        self.total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM chunks").fetchone()[0]
+
+    def get_many(self, keys: List[str]) -> Dict[str, List[float]]:
+        """Look up vectors by key and mark the hits as recently used"""
+        found: Dict[str, List[float]] = {}
+        unique = list(dict.fromkeys(keys))
+        with self._lock:
+            for start in range(0, len(unique), _SQL_BATCH):
+                batch = unique[start:start + _SQL_BATCH]
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM chunks WHERE key IN ({','.join('?' * len(batch))})",
+                    batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE chunks SET last_access = ? WHERE key = ?",
+                    [(now, key) for key in found]
+                )
+                self._conn.commit()
+            self.hits += len(found)
+            self.misses += len(unique) - len(found)
+        return found
+
+    def put_many(self, items: Dict[str, List[float]]) -> None:
+        """Store vectors and evict least recently used entries past the size limit"""
+        if not items:
+            return
+        now = time.time()
+        rows = []
+        for key, vector in items.items():
+            blob = np.asarray(vector, dtype=np.float32).tobytes()
+            rows.append((key, blob, len(blob), now))
+        with self._lock:
+            cursor = self._conn.executemany(
+                "INSERT OR IGNORE INTO chunks (key, vector, size, last_access) VALUES (?, ?, ?, ?)",
+                rows
+            )
+            self._conn.commit()
+            # rowcount skips ignored keys; every vector has the same size, so no table scan is needed
+            self.total_bytes += cursor.rowcount * rows[0][2]
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        """Drop the oldest entries until the cache is back under 90% of its limit"""
+        target = int(self.max_bytes * 0.9)
+        victims = []
+        freed = 0
+        for key, size in self._conn.execute("SELECT key, size FROM chunks ORDER BY last_access ASC"):
+            if self.total_bytes - freed <= target:
+                break
+            victims.append((key,))
+            freed += size
+        self._conn.executemany("DELETE FROM chunks WHERE key = ?", victims)
+        self._conn.commit()
+        self.total_bytes -= freed
+        self.evictions += len(victims)
+        logger.info(f"🧹 Evicted {len(victims)} cached embeddings ({freed / 1024 / 1024:.1f} MB)")
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "size_mb": round(self.total_bytes / 1024 / 1024, 2),
+            "max_size_mb": round(self.max_bytes / 1024 / 1024, 2),
+        }
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings that only encode chunks missing from the cache"""
+
+    def __init__(self, engine: EmbeddingEngine, cache: EmbeddingCache):
+        self.engine = engine
+        self.cache = cache
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        texts = list(texts)
+        keys = [chunk_key(self.engine.model_name, text) for text in texts]
+        vectors = self.cache.get_many(keys)
+
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors:
+                missing[key] = text
+        if missing:
+            encoded = dict(zip(missing.keys(), self.engine.encode(list(missing.values()))))
+            self.cache.put_many(encoded)
+            vectors.update(encoded)
+
+        return [vectors[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        # Queries are one-off, so they skip the cache
+        return self.engine.embed_query(text)
+
+
+_cached: Optional[CachedEmbeddings] = None
+_cached_lock = threading.Lock()
+
+
+def get_cached_embeddings() -> CachedEmbeddings:
+    """Return the process-wide cached wrapper around the shared embedding engine"""
+    global _cached
+    if _cached is None:
+        with _cached_lock:
+            if _cached is None:
+                _cached = CachedEmbeddings(get_embeddings(), EmbeddingCache())
+    return _cached
+
+
+__all__ = [
+    "EmbeddingCache",
+    "CachedEmbeddings",
+    "chunk_key",
+    "get_cached_embeddings",
+]
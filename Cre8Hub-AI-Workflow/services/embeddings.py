@@ -0,0 +1,91 @@
+import os
+import threading
+import logging
+from typing import List, Optional
+from langchain_core.embeddings import Embeddings
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+EMBEDDING_DEVICE = os.getenv("EMBEDDING_DEVICE", "cpu")  # Use 'cuda' if you have GPU
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+EMBEDDING_THREADS = int(os.getenv("EMBEDDING_THREADS", "0"))  # 0 keeps the torch default
+
+
+class EmbeddingEngine(Embeddings):
+    """One sentence-transformers model per process, shared by persona, chain and ingest"""
+
+    def __init__(
+        self,
+        model_name: str = EMBEDDING_MODEL,
+        device: str = EMBEDDING_DEVICE,
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+        num_threads: int = EMBEDDING_THREADS,
+        normalize: bool = True,
+    ):
+        self.model_name = model_name
+        self.device = device
+        self.batch_size = batch_size
+        self.num_threads = num_threads
+        self.normalize = normalize
+        self._model = None
+        self._load_lock = threading.Lock()
+        # SentenceTransformer.encode is not safe to call from several threads at once;
+        # torch already parallelises each batch across num_threads
+        self._encode_lock = threading.Lock()
+
+    @property
+    def model(self):
+        """Load the model weights on first use"""
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    from sentence_transformers import SentenceTransformer
+                    if self.num_threads > 0:
+                        import torch
+                        torch.set_num_threads(self.num_threads)
+                    logger.info(f"Loading embedding model {self.model_name} on {self.device}")
+                    self._model = SentenceTransformer(self.model_name, device=self.device)
+        return self._model
+
+    def encode(self, texts: List[str], batch_size: Optional[int] = None) -> List[List[float]]:
+        """Embed texts in batches"""
+        if not texts:
+            return []
+        model = self.model
+        with self._encode_lock:
+            vectors = model.encode(
+                texts,
+                batch_size=batch_size or self.batch_size,
+                normalize_embeddings=self.normalize,
+                convert_to_numpy=True,
+                show_progress_bar=False,
+            )
+        return vectors.tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.encode(list(texts))
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.encode([text])[0]
+
+
+_engine: Optional[EmbeddingEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_embeddings() -> EmbeddingEngine:
+    """Return the process-wide embedding engine"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = EmbeddingEngine()
+    return _engine
+
+
+__all__ = [
+    "EmbeddingEngine",
+    "get_embeddings",
+    "EMBEDDING_MODEL",
+]
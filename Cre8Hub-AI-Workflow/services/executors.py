@@ -0,0 +1,112 @@
+import os
+import asyncio
+import time
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Queue waits kept per executor for the p50/p95 figures in snapshot()
+EXECUTOR_WAIT_SAMPLES = int(os.getenv("EXECUTOR_WAIT_SAMPLES", "1000"))
+
+
+class ExecutorSaturated(Exception):
+    """Raised by BoundedExecutor.run when max_queue calls are already waiting"""
+
+
+def _percentile(samples, fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)] if ordered else 0.0
+
+
+class BoundedExecutor:
+    """
+    Named thread pool for blocking work called from async routes.
+    At most max_workers calls run at once; the rest wait on the event loop,
+    never in the pool's unbounded internal queue. With max_queue set, calls beyond
+    that many waiters are rejected with ExecutorSaturated instead of queueing.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: Optional[int] = None):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._slots = asyncio.Semaphore(max_workers)
+        self.waiting = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self._waits = deque(maxlen=EXECUTOR_WAIT_SAMPLES)
+
+    def saturated(self) -> bool:
+        """True when a new call would be rejected"""
+        return self.max_queue is not None and self.waiting >= self.max_queue
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run fn(*args, **kwargs) in the pool once a worker slot is free"""
+        if self.saturated():
+            self.rejected += 1
+            raise ExecutorSaturated(f"{self.name}: {self.waiting} calls already waiting")
+
+        queued_at = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+
+        waited = time.perf_counter() - queued_at
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+        self._waits.append(waited)
+        self.in_flight += 1
+        try:
+            future = asyncio.get_running_loop().run_in_executor(self._pool, partial(fn, *args, **kwargs))
+        except BaseException:
+            self._finished(None)
+            raise
+        # The slot is freed when the worker thread is done, not when the caller stops
+        # waiting: a cancelled caller must not let more than max_workers calls run
+        future.add_done_callback(self._finished)
+        return await asyncio.shield(future)
+
+    def _finished(self, future: Optional[asyncio.Future]) -> None:
+        self.in_flight -= 1
+        self._slots.release()
+        if future is not None and not future.cancelled() and future.exception() is None:
+            self.completed += 1
+        else:
+            self.failed += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        started = self.completed + self.failed + self.in_flight
+        return {
+            "name": self.name,
+            "max_workers": self.max_workers,
+            "max_queue": self.max_queue,
+            "waiting": self.waiting,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "avg_wait_ms": round(self.total_wait / started * 1000, 1) if started else 0.0,
+            "p50_wait_ms": round(_percentile(self._waits, 0.5) * 1000, 1),
+            "p95_wait_ms": round(_percentile(self._waits, 0.95) * 1000, 1),
+            "max_wait_ms": round(self.max_wait * 1000, 1),
+        }
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+__all__ = [
+    "BoundedExecutor",
+    "ExecutorSaturated",
+]
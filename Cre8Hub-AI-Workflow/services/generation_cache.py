@@ -0,0 +1,171 @@
+import os
+import time
+import asyncio
+import sqlite3
+import hashlib
+import threading
+import logging
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+from services.blob_store import BlobStore, get_blob_store
+
+logger = logging.getLogger(__name__)
+
+GENERATION_CACHE_PATH = os.getenv("GENERATION_CACHE_PATH", "cache/generations.sqlite3")
+GENERATION_CACHE_TTL = float(os.getenv("GENERATION_CACHE_TTL", str(24 * 3600)))
+GENERATION_CACHE_MAX_ENTRIES = int(os.getenv("GENERATION_CACHE_MAX_ENTRIES", "5000"))
+
+# (image bytes, MIME type)
+CachedImage = Tuple[bytes, str]
+
+
+def generation_key(model: str, prompt: str, generation_type: str, inputs: Iterable[bytes] = (), variant: int = 0) -> str:
+    """Cache key of one generated image: model, final prompt, type, input image hashes and slot"""
+    digest = hashlib.sha256()
+    for part in (model, prompt, generation_type, str(variant)):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    for data in inputs:
+        digest.update(hashlib.sha256(data).digest())
+    return digest.hexdigest()
+
+
+class GenerationCache:
+    """
+    Generated images by request key. Bytes live in the blob store; this keeps the
+    key -> blob index with TTL and LRU limits, and coalesces identical in-flight requests.
+    """
+
+    def __init__(self, blob_store: Optional[BlobStore] = None, path: str = GENERATION_CACHE_PATH,
+                 ttl: float = GENERATION_CACHE_TTL, max_entries: int = GENERATION_CACHE_MAX_ENTRIES):
+        self.blob_store = blob_store or get_blob_store()
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS generations ("
+            "key TEXT PRIMARY KEY, blob TEXT NOT NULL, mime TEXT NOT NULL, "
+            "created REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS generations_last_access ON generations(last_access)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[CachedImage]:
+        """Cached image for a key, or None if missing, expired or evicted from the blob store"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT blob, mime, created FROM generations WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            blob, mime, created = row
+            stored = self.blob_store.get(blob) if now - created <= self.ttl else None
+            if stored is None:
+                self._conn.execute("DELETE FROM generations WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE generations SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        try:
+            with open(stored[0], "rb") as f:
+                return f.read(), mime
+        except FileNotFoundError:
+            # Evicted from the blob store after the lookup: a miss, not a failed generation
+            with self._lock:
+                self._conn.execute("DELETE FROM generations WHERE key = ? AND blob = ?", (key, blob))
+                self._conn.commit()
+            return None
+
+    def put(self, key: str, data: bytes, mime: str) -> None:
+        blob = self.blob_store.put(data, mime)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO generations (key, blob, mime, created, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, blob, mime, now, now)
+            )
+            count = self._conn.execute("SELECT COUNT(*) FROM generations").fetchone()[0]
+            if count > self.max_entries:
+                self._evict(count)
+            self._conn.commit()
+
+    def _evict(self, count: int) -> None:
+        """Drop expired entries, then least recently used ones down to 90% of the limit"""
+        cursor = self._conn.execute("DELETE FROM generations WHERE created < ?", (time.time() - self.ttl,))
+        removed = cursor.rowcount
+        excess = count - removed - int(self.max_entries * 0.9)
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM generations WHERE key IN "
+                "(SELECT key FROM generations ORDER BY last_access ASC LIMIT ?)",
+                (excess,)
+            )
+            removed += excess
+        self.evictions += removed
+
+    async def get_or_generate(self, key: str, producer: Callable[[], Awaitable[Optional[CachedImage]]]) -> Optional[CachedImage]:
+        """
+        Return the cached image for key, or run producer once for all concurrent
+        callers with the same key. None results and failures are not cached.
+        """
+        loop = asyncio.get_running_loop()
+        # SQLite and the blob file are read on the default executor, off the event loop
+        cached = await loop.run_in_executor(None, self.get, key)
+        if cached is not None:
+            self.hits += 1
+            return cached
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            # The producer runs in its own task, so a caller that is cancelled (a client
+            # disconnect) neither cancels it nor passes CancelledError to the other callers
+            task = asyncio.ensure_future(self._produce(key, producer))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+        return await asyncio.shield(task)
+
+    async def _produce(self, key: str, producer: Callable[[], Awaitable[Optional[CachedImage]]]) -> Optional[CachedImage]:
+        result = await producer()
+        if result is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self.put, key, *result)
+        return result
+
+    def _finished(self, key: str, task: asyncio.Future) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Every caller may have gone; mark a failure retrieved so it is not logged as unhandled
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses + self.coalesced
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM generations").fetchone()[0]
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": round((self.hits + self.coalesced) / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "in_flight": len(self._inflight),
+            "ttl_s": self.ttl,
+        }
+
+
+__all__ = [
+    "GenerationCache",
+    "generation_key",
+]
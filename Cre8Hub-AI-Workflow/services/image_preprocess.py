@@ -0,0 +1,79 @@
+import io
+import os
+from typing import BinaryIO, Tuple, Union
+from PIL import Image
+
+# Filter for the final resize; after draft()/reduce() the image is at most ~2x the
+# target, so even lanczos is cheap. "bilinear" trades a little sharpness for speed.
+PREPROCESS_RESAMPLE = os.getenv("PREPROCESS_RESAMPLE", "lanczos")
+# Format sent to the model: JPEG and WEBP are far cheaper to encode than PNG
+PREPROCESS_FORMAT = os.getenv("PREPROCESS_FORMAT", "JPEG").upper()
+PREPROCESS_QUALITY = int(os.getenv("PREPROCESS_QUALITY", "90"))
+
+RESAMPLE_FILTERS = {
+    "nearest": Image.Resampling.NEAREST,
+    "box": Image.Resampling.BOX,
+    "bilinear": Image.Resampling.BILINEAR,
+    "hamming": Image.Resampling.HAMMING,
+    "bicubic": Image.Resampling.BICUBIC,
+    "lanczos": Image.Resampling.LANCZOS,
+}
+
+MIME_TYPES = {
+    "JPEG": "image/jpeg",
+    "WEBP": "image/webp",
+    "PNG": "image/png",
+}
+
+
+def prepare_image(
+    source: Union[bytes, BinaryIO],
+    size: Tuple[int, int],
+    resample: str = PREPROCESS_RESAMPLE,
+    fmt: str = PREPROCESS_FORMAT,
+    quality: int = PREPROCESS_QUALITY
+) -> Tuple[bytes, str]:
+    """
+    Decode, downscale and re-encode one input image for the model.
+    Returns (bytes, MIME type); the original bytes are reused when the image
+    already has the target size in a format the model accepts.
+    """
+    fmt = fmt if fmt in MIME_TYPES else "JPEG"
+    fp = io.BytesIO(source) if isinstance(source, bytes) else source
+    fp.seek(0)
+    img = Image.open(fp)
+
+    if img.size == size and img.format in MIME_TYPES:
+        fp.seek(0)
+        return fp.read(), MIME_TYPES[img.format]
+
+    if img.format == "JPEG":
+        # libjpeg decodes straight to 1/2, 1/4 or 1/8 scale, never below the target
+        img.draft("RGB", size)
+    else:
+        factor = min(img.width // size[0], img.height // size[1])
+        if factor >= 2:
+            img = img.reduce(factor)
+
+    img = img.resize(size, RESAMPLE_FILTERS.get(resample, Image.Resampling.LANCZOS))
+
+    if fmt == "JPEG" and img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+    elif fmt == "WEBP" and img.mode not in ("RGB", "RGBA"):
+        img = img.convert("RGBA" if "A" in img.getbands() or "transparency" in img.info else "RGB")
+
+    buffer = io.BytesIO()
+    if fmt == "PNG":
+        img.save(buffer, format="PNG")
+    else:
+        img.save(buffer, format=fmt, quality=quality)
+    return buffer.getvalue(), MIME_TYPES.get(fmt, "image/png")
+
+
+__all__ = [
+    "prepare_image",
+    "RESAMPLE_FILTERS",
+    "PREPROCESS_FORMAT",
+    "PREPROCESS_QUALITY",
+    "PREPROCESS_RESAMPLE",
+]
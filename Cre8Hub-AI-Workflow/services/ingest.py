@@ -1,6 +1,7 @@
 import pandas as pd
 from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import HuggingFaceEmbeddings
+from services.embeddings import get_embeddings
+from services.vectorstore import load_index
 from langchain.schema import Document
 from qdrant_client import QdrantClient
 import os
@@ -38,27 +39,13 @@ DESCRIPTION:
 def ingest():
     file_path = "/Users/prathameshpatil/Cre8hub/Cre8Hub-AI-Workflow/data/mrbeast.csv"
     docs = get_doc(file_path)
-    embeddings = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-
-    db = FAISS.from_documents(docs, embeddings)
+    db = FAISS.from_documents(docs, get_embeddings())
     db.save_local("mrbeast_faiss_index")
 
 def get_vb():
-    docs = get_doc("/Users/prathameshpatil/Cre8hub/Cre8Hub-AI-Workflow/data/mrbeast.csv")
-
-    embeddings = HuggingFaceEmbeddings(
-        model_name="all-MiniLM-L6-v2",
-        model_kwargs={"device": "cpu"}  # ✅ override MPS
-    )
     faiss_index_path = "vectorDBs/mrbeast_faiss_index"
-    if not os.path.exists(faiss_index_path):
-        raise FileNotFoundError(f"FAISS index not found at {faiss_index_path}")
-    vectorstore = FAISS.load_local(
-        faiss_index_path, 
-        embeddings=embeddings, 
-        allow_dangerous_deserialization=True
-    )
-    return vectorstore
+    return load_index(faiss_index_path)
 
 
-ingest()
\ No newline at end of file
+if __name__ == "__main__":
+    ingest()
@@ -0,0 +1,211 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import logging
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_MAX_QUEUED = int(os.getenv("JOB_MAX_QUEUED", "1000"))
+# Finished jobs stay readable this long
+JOB_TTL = float(os.getenv("JOB_TTL", "3600"))
+JOB_STORE_BACKEND = os.getenv("JOB_STORE_BACKEND", "memory")  # "memory" or "redis"
+# SSE subscribers re-read the job at least this often (picks up updates from other workers)
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+
+FINISHED = ("done", "failed")
+
+
+class QueueFull(Exception):
+    """Raised when JOB_MAX_QUEUED jobs are already waiting"""
+
+
+class InMemoryJobStore:
+    """Job records in this process; jobs are only visible to the worker that accepted them"""
+
+    def __init__(self, ttl: float = JOB_TTL):
+        self.ttl = ttl
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+
+    async def save(self, job: Dict[str, Any]) -> None:
+        self._jobs[job["id"]] = job
+
+    async def load(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self._jobs.get(job_id)
+
+    async def prune(self) -> None:
+        cutoff = time.time() - self.ttl
+        for job_id in [j["id"] for j in self._jobs.values() if j["status"] in FINISHED and j["finished_at"] < cutoff]:
+            del self._jobs[job_id]
+
+
+class RedisJobStore:
+    """Job records in Redis, so any uvicorn worker can answer status and event requests"""
+
+    def __init__(self, client, prefix: str = "job:", ttl: float = JOB_TTL):
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+
+    async def save(self, job: Dict[str, Any]) -> None:
+        await self.client.set(self.prefix + job["id"], json.dumps(job), ex=int(self.ttl))
+
+    async def load(self, job_id: str) -> Optional[Dict[str, Any]]:
+        raw = await self.client.get(self.prefix + job_id)
+        return json.loads(raw) if raw else None
+
+    async def prune(self) -> None:
+        # Redis expires records on its own
+        return None
+
+
+def create_job_store():
+    """Store selected by JOB_STORE_BACKEND"""
+    if JOB_STORE_BACKEND == "redis":
+        import redis.asyncio as aioredis
+        client = aioredis.Redis(
+            host=os.getenv("REDIS_HOST", "127.0.0.1"),
+            port=int(os.getenv("REDIS_PORT", 6379)),
+            password=os.getenv("REDIS_PASSWORD", None),
+            decode_responses=True
+        )
+        return RedisJobStore(client)
+    return InMemoryJobStore()
+
+
+class JobQueue:
+    """
+    Bounded in-process queue of long-running jobs. A fixed number of worker tasks run
+    the handlers; progress is written to the job store after every reported result.
+    """
+
+    def __init__(self, store=None, workers: int = JOB_WORKERS, max_queued: int = JOB_MAX_QUEUED):
+        self.store = store or InMemoryJobStore()
+        self.workers = workers
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queued)
+        self._tasks: List[asyncio.Task] = []
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._watchers: Dict[str, asyncio.Event] = {}
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+
+    async def start(self) -> None:
+        self._tasks = [asyncio.create_task(self._worker(n)) for n in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def submit(self, kind: str, total: int, handler: Callable[[str], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        """Queue handler(job_id); raises QueueFull instead of waiting"""
+        if self._queue.full():
+            raise QueueFull(f"{self._queue.qsize()} jobs already queued")
+        await self.store.prune()
+        job = {
+            "id": uuid.uuid4().hex,
+            "kind": kind,
+            "status": "queued",
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "total": total,
+            "completed": 0,
+            "results": [],
+            "result": None,
+            "error": None,
+            "version": 0,
+        }
+        self._jobs[job["id"]] = job
+        await self.store.save(job)
+        self._queue.put_nowait((job["id"], handler))
+        self.submitted += 1
+        return job
+
+    async def _update(self, job: Dict[str, Any], **fields) -> None:
+        job.update(fields)
+        job["version"] += 1
+        await self.store.save(job)
+        watcher = self._watchers.pop(job["id"], None)
+        if watcher is not None:
+            watcher.set()
+
+    async def report(self, job_id: str, entry: Dict[str, Any]) -> None:
+        """Record one finished result of a running job"""
+        job = self._jobs[job_id]
+        job["results"].append(entry)
+        await self._update(job, completed=job["completed"] + 1)
+
+    async def _worker(self, n: int) -> None:
+        while True:
+            job_id, handler = await self._queue.get()
+            job = self._jobs[job_id]
+            try:
+                await self._update(job, status="running", started_at=time.time())
+                result = await handler(job_id)
+                await self._update(job, status="done", result=result, finished_at=time.time())
+                self.completed += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Job {job_id} failed: {e}")
+                await self._update(job, status="failed", error=str(e), finished_at=time.time())
+                self.failed += 1
+            finally:
+                # Finished jobs are served from the store from here on
+                self._jobs.pop(job_id, None)
+                self._queue.task_done()
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self._jobs.get(job_id) or await self.store.load(job_id)
+
+    async def watch(self, job_id: str) -> AsyncIterator[Dict[str, Any]]:
+        """Yield the job every time it changes, until it finishes"""
+        version = -1
+        watcher = None
+        try:
+            while True:
+                # Register before reading so an update between the two is not missed
+                watcher = self._watchers.setdefault(job_id, asyncio.Event())
+                job = await self.get(job_id)
+                if job is None:
+                    return
+                if job["version"] != version:
+                    version = job["version"]
+                    yield job
+                if job["status"] in FINISHED:
+                    return
+                try:
+                    await asyncio.wait_for(watcher.wait(), JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            # Finished jobs, disconnected clients and jobs updated by another worker
+            # never reach _update() here, so the last event would otherwise stay forever
+            if watcher is not None and self._watchers.get(job_id) is watcher:
+                del self._watchers[job_id]
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "backend": type(self.store).__name__,
+            "workers": self.workers,
+            "queued": self._queue.qsize(),
+            "max_queued": self._queue.maxsize,
+            "running": sum(1 for job in self._jobs.values() if job["status"] == "running"),
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+        }
+
+
+__all__ = [
+    "JobQueue",
+    "QueueFull",
+    "InMemoryJobStore",
+    "RedisJobStore",
+    "create_job_store",
+]
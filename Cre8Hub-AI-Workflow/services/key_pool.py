@@ -0,0 +1,115 @@
+import os
+import time
+import threading
+import logging
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+from services.rate_limiter import key_id
+
+logger = logging.getLogger(__name__)
+
+# How long a key stays out of rotation after the API answers 429
+KEY_COOLDOWN_SECONDS = float(os.getenv("KEY_COOLDOWN_SECONDS", "60"))
+
+
+def load_api_keys() -> List[str]:
+    """GOOGLE_API_KEYS (comma-separated), falling back to the single GOOGLE_API_KEY"""
+    keys = [k.strip() for k in os.getenv("GOOGLE_API_KEYS", "").split(",") if k.strip()]
+    if not keys and os.getenv("GOOGLE_API_KEY"):
+        keys = [os.getenv("GOOGLE_API_KEY")]
+    # Keep order, drop duplicates
+    return list(dict.fromkeys(keys))
+
+
+class ApiKey:
+    """One API key and its load / health counters"""
+
+    def __init__(self, key: str):
+        self.key = key
+        self.id = key_id(key)
+        self.in_flight = 0
+        self.requests = 0
+        self.rate_limited = 0
+        self.cooldown_until = 0.0
+
+    def healthy(self, now: float) -> bool:
+        return self.cooldown_until <= now
+
+
+class KeyPool:
+    """Routes each Gemini request to the least-loaded key that is not cooling down"""
+
+    def __init__(self, keys: List[str], cooldown: float = KEY_COOLDOWN_SECONDS):
+        if not keys:
+            raise ValueError("No Gemini API keys configured. Set GOOGLE_API_KEYS or GOOGLE_API_KEY.")
+        self.keys = [ApiKey(key) for key in keys]
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+
+    def _pick(self) -> ApiKey:
+        now = time.time()
+        healthy = [k for k in self.keys if k.healthy(now)]
+        if not healthy:
+            # Every key is cooling down: use the one that recovers first
+            return min(self.keys, key=lambda k: k.cooldown_until)
+        return min(healthy, key=lambda k: (k.in_flight, k.rate_limited, k.requests))
+
+    @contextmanager
+    def lease(self) -> Iterator[ApiKey]:
+        """Reserve a key for one request; works from threads and coroutines alike"""
+        with self._lock:
+            api_key = self._pick()
+            api_key.in_flight += 1
+            api_key.requests += 1
+        try:
+            yield api_key
+        finally:
+            with self._lock:
+                api_key.in_flight -= 1
+
+    def report_rate_limited(self, api_key: ApiKey) -> None:
+        """Take a key out of rotation after a 429"""
+        with self._lock:
+            api_key.rate_limited += 1
+            api_key.cooldown_until = time.time() + self.cooldown
+        logger.warning(f"⚠️  Key {api_key.id} rate limited; cooling down for {self.cooldown:.0f}s")
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.time()
+        return {
+            "keys": len(self.keys),
+            "healthy": sum(1 for k in self.keys if k.healthy(now)),
+            "per_key": [
+                {
+                    "id": k.id,
+                    "in_flight": k.in_flight,
+                    "requests": k.requests,
+                    "rate_limited": k.rate_limited,
+                    "cooldown_remaining_s": round(max(0.0, k.cooldown_until - now), 1),
+                }
+                for k in self.keys
+            ],
+        }
+
+
+_pool: Optional[KeyPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_key_pool() -> KeyPool:
+    """Return the process-wide key pool"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = KeyPool(load_api_keys())
+                logger.info(f"🔑 Loaded {len(_pool.keys)} Gemini API key(s)")
+    return _pool
+
+
+__all__ = [
+    "ApiKey",
+    "KeyPool",
+    "get_key_pool",
+    "load_api_keys",
+]
@@ -1,8 +1,9 @@
 from typing import Dict, Any, List, Tuple
 from pydantic import ValidationError
 
-from services.chain import Persona, Critique, GenerateRequest
-from services.chain import generator_chain, critic_chain
+from models.models import Persona, Critique, GenerateRequest
+from services.chain import generator_chain, critic_chain, edit_critic_chain
+from services.patcher import split_sections, number_sections, apply_edits
 from utils.utils import parse_json_strict
 
 def build_generator_inputs(req: GenerateRequest) -> Dict[str, Any]:
@@ -22,6 +23,12 @@ def build_generator_inputs(req: GenerateRequest) -> Dict[str, Any]:
     }
 
 def build_critic_inputs(script: str, persona: Persona) -> Dict[str, Any]:
+    return {
+        **build_persona_inputs(persona),
+        "script": script,
+    }
+
+def build_persona_inputs(persona: Persona) -> Dict[str, Any]:
     return {
         "tone": persona.tone,
         "style": persona.style,
@@ -30,16 +37,28 @@ def build_critic_inputs(script: str, persona: Persona) -> Dict[str, Any]:
         "audience": persona.audience or "unspecified",
         "catchphrases": ", ".join(persona.catchphrases) if persona.catchphrases else "none",
         "signature_patterns": ", ".join(persona.signature_patterns) if persona.signature_patterns else "none",
-        "script": script,
     }
 
 def refine_once(script: str, persona: Persona) -> Tuple[Critique, str]:
     raw = critic_chain.run(build_critic_inputs(script, persona))
     data = parse_json_strict(raw)
     critique = Critique(**data)
-    improved = critique.partial_rewrite.strip() if critique.partial_rewrite.strip() else script
+    rewrite = (critique.partial_rewrite or "").strip()
+    improved = rewrite if rewrite else script
     return critique, improved
 
+def refine_with_edits(script: str, persona: Persona) -> Tuple[Critique, str, int]:
+    """
+    One edit round: the critic sees the script as tagged paragraphs and answers with
+    edits to the ones that need changing, which are patched in locally. Output tokens
+    scale with the edits rather than the script. Returns (critique, script, edits applied).
+    """
+    sections, separator = split_sections(script)
+    raw = edit_critic_chain.run({**build_persona_inputs(persona), "sections": number_sections(sections)})
+    critique = Critique(**parse_json_strict(raw))
+    patched, applied, _ = apply_edits(sections, critique.edits)
+    return critique, separator.join(patched) if applied else script, applied
+
 def run_refinement(req: GenerateRequest) -> Dict[str, Any]:
     # First draft
     draft = generator_chain.run(build_generator_inputs(req))
@@ -47,6 +66,25 @@ def run_refinement(req: GenerateRequest) -> Dict[str, Any]:
     best = draft
     history: List[Critique] = []
 
+    if req.refine_mode == "edits":
+        for _ in range(req.max_iters):
+            try:
+                critique, patched, applied = refine_with_edits(best, req.persona)
+            except (ValueError, ValidationError):
+                # Unparseable or invalid critic reply: keep the script we have
+                break
+            history.append(critique)
+            # Passed (the score is for the script the critic saw, so it is returned
+            # unpatched), or nothing left that the critic can point at
+            if critique.score >= req.pass_score or not applied:
+                break
+            best = patched
+
+        return {
+            "final_script": best,
+            "critic_history": [c.model_dump() for c in history],
+        }
+
     for _ in range(req.max_iters):
         critique, improved = refine_once(best, req.persona)
         history.append(critique)
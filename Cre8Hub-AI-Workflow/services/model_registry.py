@@ -0,0 +1,174 @@
+import os
+import json
+import time
+import asyncio
+import threading
+import logging
+from typing import Any, Dict, List, Optional, Tuple, Union
+import google.generativeai as genai
+from google.ai import generativelanguage as glm
+from services.key_pool import ApiKey, KeyPool
+from services.rate_limiter import RateLimiter, estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# "grpc" keeps one long-lived channel per key; "rest" uses a pooled HTTP session
+GEMINI_TRANSPORT = os.getenv("GEMINI_TRANSPORT", "grpc")
+# Per-model request options, e.g. {"gemini-2.5-flash-image": {"generation_config": {"temperature": 0.8}}}
+GEMINI_MODEL_OPTIONS = json.loads(os.getenv("GEMINI_MODEL_OPTIONS", "{}"))
+# /health/models answers from probe results younger than this instead of probing again
+MODEL_PROBE_TTL = float(os.getenv("MODEL_PROBE_TTL", "60"))
+# A probe that would wait longer than this for quota reports the key as rate limited instead
+MODEL_PROBE_MAX_WAIT = float(os.getenv("MODEL_PROBE_MAX_WAIT", "5"))
+
+
+def _to_part(part: Union[str, Dict[str, Any], glm.Part]) -> glm.Part:
+    if isinstance(part, glm.Part):
+        return part
+    if isinstance(part, str):
+        return glm.Part(text=part)
+    if isinstance(part, dict) and "data" in part:
+        return glm.Part(inline_data=glm.Blob(mime_type=part["mime_type"], data=part["data"]))
+    raise TypeError(f"Unsupported content part: {type(part).__name__}")
+
+
+class KeyedModel:
+    """
+    One model bound to one API key. Requests go straight to the key's own
+    GenerativeServiceClient, and responses come back as genai GenerateContentResponse
+    objects so callers keep the usual .parts / .text accessors.
+    """
+
+    def __init__(self, model_name: str, client: glm.GenerativeServiceClient,
+                 generation_config: Optional[Dict[str, Any]] = None,
+                 safety_settings: Optional[List[Dict[str, Any]]] = None):
+        self.model_name = model_name if model_name.startswith("models/") else f"models/{model_name}"
+        self.client = client
+        self.generation_config = glm.GenerationConfig(**generation_config) if generation_config else None
+        self.safety_settings = [glm.SafetySetting(**setting) for setting in safety_settings or []]
+
+    def _contents(self, contents) -> List[glm.Content]:
+        # A prompt string, or a list of parts (text and {"mime_type", "data"} blobs), is one user turn
+        parts = contents if isinstance(contents, (list, tuple)) else [contents]
+        return [glm.Content(role="user", parts=[_to_part(part) for part in parts])]
+
+    def generate_content(self, contents) -> genai.types.GenerateContentResponse:
+        request = glm.GenerateContentRequest(
+            model=self.model_name,
+            contents=self._contents(contents),
+            generation_config=self.generation_config,
+            safety_settings=self.safety_settings
+        )
+        return genai.types.GenerateContentResponse.from_response(self.client.generate_content(request))
+
+    def count_tokens(self, contents) -> glm.CountTokensResponse:
+        return self.client.count_tokens(glm.CountTokensRequest(
+            model=self.model_name,
+            contents=self._contents(contents)
+        ))
+
+
+class ModelRegistry:
+    """
+    KeyedModel instances keyed by (model name, API key), built once and reused
+    so every call on a key shares one client and its open connection
+    """
+
+    def __init__(self, key_pool: KeyPool, model_names: List[str], transport: str = GEMINI_TRANSPORT,
+                 options: Optional[Dict[str, Dict[str, Any]]] = None,
+                 rate_limiter: Optional[RateLimiter] = None, probe_ttl: float = MODEL_PROBE_TTL):
+        self.key_pool = key_pool
+        self.model_names = list(model_names)
+        self.transport = transport
+        self.options = options if options is not None else GEMINI_MODEL_OPTIONS
+        self.rate_limiter = rate_limiter
+        self.probe_ttl = probe_ttl
+        self._clients: Dict[str, glm.GenerativeServiceClient] = {}
+        self._models: Dict[Tuple[str, str], KeyedModel] = {}
+        self._probes: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._probe_lock = asyncio.Lock()
+
+    def _client(self, api_key: ApiKey) -> glm.GenerativeServiceClient:
+        # genai.configure only holds one global key, so each key gets its own client;
+        # models on the same key share it
+        if api_key.id not in self._clients:
+            self._clients[api_key.id] = glm.GenerativeServiceClient(
+                transport=self.transport,
+                client_options={"api_key": api_key.key}
+            )
+        return self._clients[api_key.id]
+
+    def get(self, model_name: str, api_key: ApiKey) -> KeyedModel:
+        """Model bound to one API key, created on first use"""
+        entry = (model_name, api_key.id)
+        model = self._models.get(entry)
+        if model is None:
+            with self._lock:
+                model = self._models.get(entry)
+                if model is None:
+                    model = KeyedModel(model_name, self._client(api_key), **self.options.get(model_name, {}))
+                    self._models[entry] = model
+        return model
+
+    def warm_up(self) -> int:
+        """Build every (model, key) pair up front so no request pays for client setup"""
+        for model_name in self.model_names:
+            for api_key in self.key_pool.keys:
+                self.get(model_name, api_key)
+        logger.info(f"🔥 Model registry ready: {len(self._models)} model(s) on {len(self._clients)} client(s)")
+        return len(self._models)
+
+    def probe(self, model_name: str, api_key: ApiKey) -> Dict[str, Any]:
+        """One count_tokens round trip: opens the connection and checks the key can reach the model"""
+        started = time.perf_counter()
+        try:
+            # Probes spend the same per-key quota as real calls
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire_sync(model_name, api_key.key, estimate_tokens("ping"), MODEL_PROBE_MAX_WAIT)
+            self.get(model_name, api_key).count_tokens("ping")
+            result = {"ok": True}
+        except Exception as e:
+            result = {"ok": False, "error": str(e)[:200]}
+        result["latency_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        result["checked_at"] = time.time()
+        self._probes[f"{model_name}:{api_key.id}"] = result
+        return result
+
+    async def probe_all(self, max_age: Optional[float] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Probe every (model, key) pair concurrently. Pairs probed within max_age seconds
+        (default probe_ttl) keep their last result, and concurrent callers share one round.
+        """
+        max_age = self.probe_ttl if max_age is None else max_age
+        loop = asyncio.get_running_loop()
+        pairs = [(model_name, api_key) for model_name in self.model_names for api_key in self.key_pool.keys]
+        async with self._probe_lock:
+            now = time.time()
+            stale = [
+                (model_name, api_key) for model_name, api_key in pairs
+                if now - self._probes.get(f"{model_name}:{api_key.id}", {}).get("checked_at", 0) > max_age
+            ]
+            await asyncio.gather(*[
+                loop.run_in_executor(None, self.probe, model_name, api_key)
+                for model_name, api_key in stale
+            ])
+        report: Dict[str, Dict[str, Any]] = {}
+        for model_name, api_key in pairs:
+            report.setdefault(model_name, {})[api_key.id] = self._probes[f"{model_name}:{api_key.id}"]
+        return report
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "transport": self.transport,
+            "models": self.model_names,
+            "clients": len(self._clients),
+            "instances": len(self._models),
+            "probes": dict(self._probes),
+        }
+
+
+__all__ = [
+    "KeyedModel",
+    "ModelRegistry",
+]
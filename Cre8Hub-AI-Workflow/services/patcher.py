@@ -0,0 +1,70 @@
+import re
+from typing import Iterable, List, Tuple
+
+# A section tag the model may echo back at the start of its replacement text
+_TAG = re.compile(r"^\s*\[P\d+\]\s*", re.IGNORECASE)
+
+
+def split_sections(script: str) -> Tuple[List[str], str]:
+    """
+    Paragraphs of a script and the separator to join them back with. Scripts without
+    blank-line breaks are split into lines instead.
+    """
+    sections = [block.strip() for block in re.split(r"\n\s*\n", script.strip()) if block.strip()]
+    if len(sections) > 1:
+        return sections, "\n\n"
+    return [line.strip() for line in script.strip().splitlines() if line.strip()], "\n"
+
+
+def section_id(index: int) -> str:
+    return f"P{index + 1}"
+
+
+def number_sections(sections: List[str]) -> str:
+    """Script text with every section tagged by its ID, as the edit critic sees it"""
+    return "\n\n".join(f"[{section_id(i)}] {text}" for i, text in enumerate(sections))
+
+
+def apply_edits(sections: List[str], edits: Iterable) -> Tuple[List[str], int, int]:
+    """
+    Apply replace / insert_after / delete edits addressed by section ID to a copy of
+    sections. IDs always refer to the numbering the critic saw, whatever order the
+    edits come in. Returns (sections, applied, skipped); edits with an unknown ID or
+    op, or no text where text is needed, are skipped.
+    """
+    ids = {section_id(i): i for i in range(len(sections))}
+    patched: List = list(sections)  # None marks a deleted section
+    inserted: List[List[str]] = [[] for _ in sections]
+    applied = skipped = 0
+
+    for edit in edits:
+        index = ids.get(edit.id.strip().strip("[]").upper())
+        text = _TAG.sub("", edit.text or "").strip()
+        if index is None:
+            skipped += 1
+        elif edit.op == "replace" and text:
+            patched[index] = text
+            applied += 1
+        elif edit.op == "insert_after" and text:
+            inserted[index].append(text)
+            applied += 1
+        elif edit.op == "delete":
+            patched[index] = None
+            applied += 1
+        else:
+            skipped += 1
+
+    result: List[str] = []
+    for text, extra in zip(patched, inserted):
+        if text is not None:
+            result.append(text)
+        result.extend(extra)
+    return result, applied, skipped
+
+
+__all__ = [
+    "apply_edits",
+    "number_sections",
+    "section_id",
+    "split_sections",
+]
@@ -0,0 +1,208 @@
+import os
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PERSONA_CACHE_SIZE = int(os.getenv("PERSONA_CACHE_SIZE", "10000"))
+PERSONA_CACHE_TTL = float(os.getenv("PERSONA_CACHE_TTL", "300"))
+# persona.py publishes a user ID here whenever it saves or deletes that user's persona
+PERSONA_INVALIDATION_CHANNEL = os.getenv("PERSONA_INVALIDATION_CHANNEL", "persona:invalidate")
+PERSONA_RESUBSCRIBE_DELAY = float(os.getenv("PERSONA_RESUBSCRIBE_DELAY", "5"))
+# How long one pub/sub read waits for a message; kept below the Redis socket_timeout
+# so an idle channel is never mistaken for a dropped connection
+PERSONA_POLL_TIMEOUT = float(os.getenv("PERSONA_POLL_TIMEOUT", "1"))
+
+
+class PersonaNotFound(Exception):
+    """The user has no stored persona"""
+
+
+class PersonaUnavailable(Exception):
+    """MongoDB is not connected, so user personas cannot be loaded"""
+
+
+def _first(*values):
+    for value in values:
+        if value:
+            return value
+    return None
+
+
+def _join(value) -> Optional[str]:
+    if isinstance(value, list):
+        return ", ".join(str(item) for item in value if item) or None
+    return value or None
+
+
+def normalize_persona(document: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Map a users document onto the fields the cre8echo templates use (the responses.json
+    shape). Accepts personas in that shape, the userModel.js schema and the schema
+    persona.py asks the extraction model for.
+    """
+    persona = document.get("persona") or {}
+    communication = persona.get("communication_style")
+    communication = communication if isinstance(communication, dict) else {}
+    engagement = persona.get("audience_engagement")
+    engagement = engagement if isinstance(engagement, dict) else {}
+    normalized = {
+        "creator_name": _first(persona.get("creator_name"), document.get("fullName"), document.get("name")),
+        "tone": _first(persona.get("tone"), communication.get("tone"), persona.get("communicationStyle")),
+        "style": _first(
+            persona.get("style"),
+            _join([engagement.get("style"), communication.get("sentence_structure")]),
+            _join(persona.get("contentPreferences"))
+        ),
+        "catchphrases": _first(persona.get("catchphrases"), persona.get("unique_phrases")),
+        "quirks": _first(persona.get("quirks"), persona.get("personality_traits"), persona.get("personalityTraits")),
+    }
+    return {field: value for field, value in normalized.items() if value}
+
+
+class PersonaStore:
+    """
+    Personas by user ID, read from the users collection through an in-process LRU
+    cache with TTL. Writers publish the user ID on PERSONA_INVALIDATION_CHANNEL so
+    every worker drops its copy; the TTL bounds staleness if a message is missed.
+    """
+
+    def __init__(self, datastore, size: int = PERSONA_CACHE_SIZE, ttl: float = PERSONA_CACHE_TTL,
+                 channel: str = PERSONA_INVALIDATION_CHANNEL):
+        self.datastore = datastore
+        self.size = size
+        self.ttl = ttl
+        self.channel = channel
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.invalidations = 0
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._listener: Optional[asyncio.Task] = None
+
+    async def get(self, user_id: str) -> Dict[str, Any]:
+        """Normalized persona for a user; raises PersonaNotFound or PersonaUnavailable"""
+        entry = self._entries.get(user_id)
+        if entry is not None and entry[0] > time.monotonic():
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[1]
+
+        if user_id in self._inflight:
+            self.coalesced += 1
+            return await asyncio.shield(self._inflight[user_id])
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[user_id] = future
+        try:
+            persona = await self._load(user_id)
+            # An invalidation that arrived during the load wins over what was read
+            if self._inflight.get(user_id) is future:
+                self._entries[user_id] = (time.monotonic() + self.ttl, persona)
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.size:
+                    self._entries.popitem(last=False)
+            future.set_result(persona)
+            return persona
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            if self._inflight.get(user_id) is future:
+                del self._inflight[user_id]
+
+    async def _load(self, user_id: str) -> Dict[str, Any]:
+        if self.datastore.users is None:
+            raise PersonaUnavailable("MongoDB service unavailable")
+        document = await self.datastore.users.find_one(
+            {"_id": user_id},
+            {"persona": 1, "fullName": 1, "name": 1}
+        )
+        if not document or not document.get("persona"):
+            raise PersonaNotFound(f"No persona found for user: {user_id}")
+        return normalize_persona(document)
+
+    def invalidate(self, user_id: Optional[str] = None) -> None:
+        """Drop one user's persona, or every cached persona when user_id is None"""
+        # Loads already in flight may have read the old document, so they are not cached either
+        if user_id is None:
+            self._entries.clear()
+            self._inflight.clear()
+        else:
+            self._entries.pop(user_id, None)
+            self._inflight.pop(user_id, None)
+        self.invalidations += 1
+
+    async def start(self) -> None:
+        """Subscribe to invalidations; without Redis, cached personas only expire by TTL"""
+        if self.datastore.redis is None:
+            logger.warning(f"⚠️ Redis unavailable, personas refresh every {self.ttl:.0f}s via TTL only")
+            return
+        self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+
+    async def _listen(self) -> None:
+        while True:
+            pubsub = self.datastore.redis.pubsub()
+            try:
+                await pubsub.subscribe(self.channel)
+                logger.info(f"📡 Listening for persona invalidations on {self.channel}")
+                while True:
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=PERSONA_POLL_TIMEOUT)
+                    if message is not None and message.get("type") == "message":
+                        self.invalidate(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Messages may have been missed while disconnected
+                logger.error(f"❌ Persona invalidation listener failed: {e}")
+                self.invalidate()
+                await asyncio.sleep(PERSONA_RESUBSCRIBE_DELAY)
+            finally:
+                await pubsub.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": round((self.hits + self.coalesced) / lookups, 3) if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "listening": self._listener is not None and not self._listener.done(),
+            "ttl_s": self.ttl,
+        }
+
+
+async def publish_persona_invalidation(redis, user_id: str, channel: str = PERSONA_INVALIDATION_CHANNEL) -> None:
+    """Tell every PersonaStore to drop its cached copy of this user's persona"""
+    if redis is None:
+        return
+    try:
+        await redis.publish(channel, user_id)
+    except Exception as e:
+        logger.warning(f"⚠️ Could not publish persona invalidation for {user_id}: {e}")
+
+
+__all__ = [
+    "PersonaStore",
+    "PersonaNotFound",
+    "PersonaUnavailable",
+    "normalize_persona",
+    "publish_persona_invalidation",
+]
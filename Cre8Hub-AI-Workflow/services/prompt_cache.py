@@ -0,0 +1,190 @@
+import os
+import re
+import time
+import hashlib
+import threading
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple
+from services.rate_limiter import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+PROMPT_CACHE_BACKEND = os.getenv("PROMPT_CACHE_BACKEND", "local")  # "local" or "gemini"
+PROMPT_CACHE_TTL = float(os.getenv("PROMPT_CACHE_TTL", "3600"))
+PROMPT_CACHE_SIZE = int(os.getenv("PROMPT_CACHE_SIZE", "1024"))
+# Gemini only accepts cached contexts above a model-specific size; smaller prefixes
+# are sent inline, where they still benefit from the provider's implicit prefix caching
+PROMPT_CACHE_MIN_TOKENS = int(os.getenv("PROMPT_CACHE_MIN_TOKENS", "4096"))
+
+_VARIABLE = re.compile(r"(?<!\{)\{(\w+)\}(?!\})")
+
+
+def split_template(template: str, variable_fields: Iterable[str]) -> Tuple[str, str]:
+    """
+    Split a prompt template into a stable prefix and a per-call suffix.
+    Blank-line separated blocks that use a variable field move to the suffix, as does
+    the closing cue (the last block); every other block keeps its order in the prefix.
+    """
+    variable = set(variable_fields)
+    blocks = [block for block in re.split(r"\n\s*\n", template.strip()) if block.strip()]
+    prefix, suffix = [], []
+    for index, block in enumerate(blocks):
+        if index == len(blocks) - 1 or variable & set(_VARIABLE.findall(block)):
+            suffix.append(block)
+        else:
+            prefix.append(block)
+    return "\n\n".join(prefix), "\n\n".join(suffix)
+
+
+class CachedPrefix:
+    """A rendered prefix and, when the provider cached it, the cached content name"""
+
+    __slots__ = ("text", "tokens", "name", "api_key", "expires_at")
+
+    def __init__(self, text: str, name: Optional[str], ttl: float, api_key=None):
+        self.text = text
+        self.tokens = estimate_tokens(text)
+        self.name = name
+        # The key that owns the provider cache, needed to delete it
+        self.api_key = api_key
+        # Stop handing out the provider handle a minute before the provider drops it
+        self.expires_at = time.time() + max(ttl - 60, ttl / 2)
+
+
+class PromptPrefixCache:
+    """
+    Stable prompt prefixes keyed by (model, API key, content hash), LRU-bounded.
+    This local stand-in never talks to the provider: prefixes are still sent inline,
+    and the counters show how many prefix tokens a provider cache would have saved.
+    """
+
+    def __init__(self, size: int = PROMPT_CACHE_SIZE, ttl: float = PROMPT_CACHE_TTL):
+        self.size = size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.reused_tokens = 0
+        self._entries: "OrderedDict[str, CachedPrefix]" = OrderedDict()
+        self._creating: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+
+    def get(self, model: str, api_key, text: str) -> CachedPrefix:
+        """Cached entry for a rendered prefix, creating it (and any provider cache) on a miss"""
+        key = hashlib.sha256(f"{model}\0{api_key.id}\0{text}".encode("utf-8")).hexdigest()
+        while True:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None and entry.expires_at > time.time():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    self.reused_tokens += entry.tokens
+                    return entry
+                creating = self._creating.get(key)
+                if creating is None:
+                    creating = self._creating[key] = threading.Event()
+                    self.misses += 1
+                    break
+            # Another thread is creating this prefix; one provider cache per key is enough
+            creating.wait()
+
+        evicted = []
+        try:
+            entry = CachedPrefix(text, self._create(model, api_key, text), self.ttl, api_key)
+            with self._lock:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.size:
+                    evicted.append(self._entries.popitem(last=False)[1])
+        finally:
+            with self._lock:
+                del self._creating[key]
+            creating.set()
+        for old in evicted:
+            if old.name:
+                self._delete(old)
+        return entry
+
+    def _create(self, model: str, api_key, text: str) -> Optional[str]:
+        """Provider-side cache for the prefix; the local stand-in has none"""
+        return None
+
+    def _delete(self, entry: CachedPrefix) -> None:
+        """Release the provider-side cache of an evicted entry"""
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self).__name__,
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "reused_prefix_tokens": self.reused_tokens,
+            "provider_cached": sum(1 for entry in self._entries.values() if entry.name),
+        }
+
+
+class GeminiContextCache(PromptPrefixCache):
+    """Prefix cache backed by Gemini context caching (cachedContents), one per API key"""
+
+    def __init__(self, min_tokens: int = PROMPT_CACHE_MIN_TOKENS, **kwargs):
+        super().__init__(**kwargs)
+        self.min_tokens = min_tokens
+        self._clients: Dict[str, Any] = {}
+
+    def _client(self, api_key):
+        # Cached contents belong to the key's project, so each key gets its own client
+        from google.ai import generativelanguage as glm
+        if api_key.id not in self._clients:
+            self._clients[api_key.id] = glm.CacheServiceClient(client_options={"api_key": api_key.key})
+        return self._clients[api_key.id]
+
+    def _create(self, model: str, api_key, text: str) -> Optional[str]:
+        if estimate_tokens(text) < self.min_tokens:
+            return None
+        from google.ai import generativelanguage as glm
+        try:
+            cached = self._client(api_key).create_cached_content(
+                cached_content=glm.CachedContent(
+                    model=f"models/{model}",
+                    system_instruction=glm.Content(parts=[glm.Part(text=text)]),
+                    ttl={"seconds": int(self.ttl)}
+                )
+            )
+            logger.info(f"🗄️  Cached {estimate_tokens(text)}-token prompt prefix as {cached.name}")
+            return cached.name
+        except Exception as e:
+            # Fall back to sending the prefix inline
+            logger.warning(f"⚠️  Context caching failed for {model}: {e}")
+            return None
+
+    def _delete(self, entry: CachedPrefix) -> None:
+        # Cached contents are billed for storage until their TTL runs out
+        try:
+            self._client(entry.api_key).delete_cached_content(name=entry.name)
+        except Exception as e:
+            logger.warning(f"⚠️  Could not delete cached prompt prefix {entry.name}: {e}")
+
+
+_cache: Optional[PromptPrefixCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_prompt_cache() -> PromptPrefixCache:
+    """Return the process-wide prefix cache selected by PROMPT_CACHE_BACKEND"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = GeminiContextCache() if PROMPT_CACHE_BACKEND == "gemini" else PromptPrefixCache()
+    return _cache
+
+
+__all__ = [
+    "CachedPrefix",
+    "PromptPrefixCache",
+    "GeminiContextCache",
+    "get_prompt_cache",
+    "split_template",
+]
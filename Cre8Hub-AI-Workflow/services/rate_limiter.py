@@ -0,0 +1,319 @@
+import os
+import json
+import time
+import asyncio
+import hashlib
+import threading
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+from langchain_core.callbacks import BaseCallbackHandler
+
+logger = logging.getLogger(__name__)
+
+# Documented Gemini quotas (see RATE_LIMIT_SOLUTIONS.md): ~15 RPM on the free tier,
+# ~60 RPM on the paid tier. TPM is only enforced when configured.
+DEFAULT_QUOTAS = {
+    "free": {"rpm": 15, "tpm": None},
+    "paid": {"rpm": 60, "tpm": None},
+}
+
+GEMINI_TIER = os.getenv("GEMINI_TIER", "free")
+# Per-model overrides, e.g. {"gemini-2.5-flash-image": {"rpm": 10}, "gemini-2.0-flash-exp": {"rpm": 30, "tpm": 1000000}}
+GEMINI_RATE_LIMITS = json.loads(os.getenv("GEMINI_RATE_LIMITS", "{}"))
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "local")  # "local" or "redis"
+# Requests that would have to wait longer than this fail fast instead
+RATE_LIMIT_MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", "300"))
+# How long a key/model pair is paused after the API answers 429 anyway
+RATE_LIMIT_PENALTY = float(os.getenv("RATE_LIMIT_PENALTY", "30"))
+# While Redis is unreachable the redis backend uses per-process buckets, and tries
+# Redis again after this many seconds
+RATE_LIMIT_REDIS_RETRY = float(os.getenv("RATE_LIMIT_REDIS_RETRY", "30"))
+
+
+class RateLimitExceeded(Exception):
+    """Raised when the wait for quota would exceed RATE_LIMIT_MAX_WAIT"""
+
+    def __init__(self, model: str, wait: float):
+        self.model = model
+        self.wait = wait
+        super().__init__(f"Rate limit exceeded for {model}: next slot in {wait:.0f}s")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough Gemini token count (~4 characters per token)"""
+    return len(text) // 4 + 1
+
+
+def is_quota_error(error: Exception) -> bool:
+    """Whether the API answered 429: the key ran out of quota. Drives key cooldowns and retries"""
+    error_msg = str(error).lower()
+    return any(x in error_msg for x in ['429', 'resource_exhausted', 'resource exhausted', 'quota'])
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """Whether a request failed on rate limits: a 429 from the API, or our own limiter refusing to wait"""
+    return isinstance(error, RateLimitExceeded) or is_quota_error(error)
+
+
+def key_id(api_key: Optional[str]) -> str:
+    """Stable, non-secret identifier for an API key"""
+    return hashlib.sha256((api_key or "").encode()).hexdigest()[:12]
+
+
+class LocalBucketBackend:
+    """In-process token buckets; each uvicorn worker gets its own budget"""
+
+    def __init__(self):
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def reserve(self, key: str, capacity: float, rate: float, amount: float) -> float:
+        """
+        Take amount from the bucket, letting it go negative, and return how long
+        the caller must wait before using what it took
+        """
+        now = time.time()
+        with self._lock:
+            level, updated = self._buckets.get(key, (capacity, now))
+            level = min(capacity, level + (now - updated) * rate) - amount
+            self._buckets[key] = (level, now)
+        return max(0.0, -level / rate)
+
+    async def areserve(self, key: str, capacity: float, rate: float, amount: float) -> float:
+        return self.reserve(key, capacity, rate, amount)
+
+    def drain(self, key: str, level: float) -> None:
+        """Lower the bucket to at most `level`, keeping any deeper existing debt"""
+        now = time.time()
+        with self._lock:
+            current, _ = self._buckets.get(key, (level, now))
+            self._buckets[key] = (min(current, level), now)
+
+    async def adrain(self, key: str, level: float) -> None:
+        self.drain(key, level)
+
+
+_RESERVE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local amount = tonumber(ARGV[3])
+local now = tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'level', 'updated')
+local level = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+level = math.min(capacity, level + math.max(0, now - updated) * rate) - amount
+redis.call('HSET', KEYS[1], 'level', tostring(level), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 3600)
+return tostring(level)
+"""
+
+_DRAIN_SCRIPT = """
+local level = tonumber(ARGV[1])
+local current = tonumber(redis.call('HGET', KEYS[1], 'level')) or level
+redis.call('HSET', KEYS[1], 'level', tostring(math.min(current, level)), 'updated', ARGV[2])
+redis.call('EXPIRE', KEYS[1], 3600)
+return 1
+"""
+
+
+class RedisBucketBackend:
+    """
+    Token buckets in Redis, so every worker shares one budget per key and model.
+    If Redis cannot be reached, calls fall back to per-process buckets rather than
+    failing every Gemini request, and Redis is retried after RATE_LIMIT_REDIS_RETRY.
+    """
+
+    def __init__(self, prefix: str = "ratelimit:", retry_after: float = RATE_LIMIT_REDIS_RETRY):
+        import redis
+        import redis.asyncio as aioredis
+        settings = dict(
+            host=os.getenv("REDIS_HOST", "127.0.0.1"),
+            port=int(os.getenv("REDIS_PORT", 6379)),
+            password=os.getenv("REDIS_PASSWORD", None),
+            decode_responses=True,
+            socket_timeout=2,
+            socket_connect_timeout=2
+        )
+        self.prefix = prefix
+        self.retry_after = retry_after
+        self.fallback = LocalBucketBackend()
+        self._errors = (redis.exceptions.RedisError, OSError)
+        self._down_until = 0.0
+        client = redis.Redis(**settings)
+        async_client = aioredis.Redis(**settings)
+        self._script = client.register_script(_RESERVE_SCRIPT)
+        self._drain_script = client.register_script(_DRAIN_SCRIPT)
+        self._async_script = async_client.register_script(_RESERVE_SCRIPT)
+        self._async_drain_script = async_client.register_script(_DRAIN_SCRIPT)
+
+    def _available(self) -> bool:
+        return time.time() >= self._down_until
+
+    def _failed(self, error: Exception) -> None:
+        # Logged once per outage: later calls skip Redis until the retry time
+        self._down_until = time.time() + self.retry_after
+        logger.error(f"❌ Rate limiter Redis unavailable ({error}); using per-process buckets for {self.retry_after:.0f}s")
+
+    def reserve(self, key: str, capacity: float, rate: float, amount: float) -> float:
+        if self._available():
+            try:
+                level = float(self._script(keys=[self.prefix + key], args=[capacity, rate, amount, time.time()]))
+                return max(0.0, -level / rate)
+            except self._errors as e:
+                self._failed(e)
+        return self.fallback.reserve(key, capacity, rate, amount)
+
+    async def areserve(self, key: str, capacity: float, rate: float, amount: float) -> float:
+        if self._available():
+            try:
+                level = float(await self._async_script(keys=[self.prefix + key], args=[capacity, rate, amount, time.time()]))
+                return max(0.0, -level / rate)
+            except self._errors as e:
+                self._failed(e)
+        return self.fallback.reserve(key, capacity, rate, amount)
+
+    def drain(self, key: str, level: float) -> None:
+        if self._available():
+            try:
+                self._drain_script(keys=[self.prefix + key], args=[level, time.time()])
+                return
+            except self._errors as e:
+                self._failed(e)
+        self.fallback.drain(key, level)
+
+    async def adrain(self, key: str, level: float) -> None:
+        if self._available():
+            try:
+                await self._async_drain_script(keys=[self.prefix + key], args=[level, time.time()])
+                return
+            except self._errors as e:
+                self._failed(e)
+        self.fallback.drain(key, level)
+
+
+class RateLimiter:
+    """Per-model, per-API-key request and token buckets shared by every Gemini caller"""
+
+    def __init__(self, backend=None, tier: str = GEMINI_TIER, overrides: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.backend = backend or LocalBucketBackend()
+        self.defaults = DEFAULT_QUOTAS.get(tier, DEFAULT_QUOTAS["free"])
+        self.overrides = overrides if overrides is not None else GEMINI_RATE_LIMITS
+        self.waits: Dict[str, float] = {}
+        self.requests: Dict[str, int] = {}
+
+    def quota(self, model: str) -> Dict[str, Optional[float]]:
+        return {**self.defaults, **self.overrides.get(model, {})}
+
+    def _reservations(self, model: str, api_key: Optional[str], tokens: int) -> List[Tuple[str, float, float, float]]:
+        """(bucket key, capacity, refill per second, amount) for each enforced limit"""
+        quota = self.quota(model)
+        base = f"{model}:{key_id(api_key)}"
+        buckets = [(f"{base}:rpm", quota["rpm"], quota["rpm"] / 60, 1)]
+        if quota.get("tpm") and tokens:
+            buckets.append((f"{base}:tpm", quota["tpm"], quota["tpm"] / 60, tokens))
+        return buckets
+
+    def _record(self, model: str, wait: float) -> None:
+        self.requests[model] = self.requests.get(model, 0) + 1
+        self.waits[model] = self.waits.get(model, 0.0) + wait
+
+    async def acquire(self, model: str, api_key: Optional[str], tokens: int = 0) -> float:
+        """Wait until the model/key pair has quota for one request of ~tokens tokens"""
+        reservations = self._reservations(model, api_key, tokens)
+        wait = max([await self.backend.areserve(*reservation) for reservation in reservations])
+        if wait > RATE_LIMIT_MAX_WAIT:
+            # Give the quota back so the rejected request does not delay others
+            for key, capacity, rate, amount in reservations:
+                await self.backend.areserve(key, capacity, rate, -amount)
+            raise RateLimitExceeded(model, wait)
+        self._record(model, wait)
+        if wait > 0:
+            logger.info(f"⏳ Rate limiter: waiting {wait:.1f}s for {model}")
+            await asyncio.sleep(wait)
+        return wait
+
+    def acquire_sync(self, model: str, api_key: Optional[str], tokens: int = 0,
+                     max_wait: float = RATE_LIMIT_MAX_WAIT) -> float:
+        """Blocking acquire for code that already runs in a worker thread"""
+        reservations = self._reservations(model, api_key, tokens)
+        wait = max([self.backend.reserve(*reservation) for reservation in reservations])
+        if wait > max_wait:
+            for key, capacity, rate, amount in reservations:
+                self.backend.reserve(key, capacity, rate, -amount)
+            raise RateLimitExceeded(model, wait)
+        self._record(model, wait)
+        if wait > 0:
+            logger.info(f"⏳ Rate limiter: waiting {wait:.1f}s for {model}")
+            time.sleep(wait)
+        return wait
+
+    def penalize(self, model: str, api_key: Optional[str], seconds: float = RATE_LIMIT_PENALTY) -> None:
+        """The API returned 429 anyway: push the request bucket `seconds` into debt"""
+        key, _, rate, _ = self._reservations(model, api_key, 0)[0]
+        self.backend.drain(key, -seconds * rate)
+        logger.warning(f"⚠️  429 from {model}; pausing key {key_id(api_key)} for ~{seconds:.0f}s")
+
+    async def apenalize(self, model: str, api_key: Optional[str], seconds: float = RATE_LIMIT_PENALTY) -> None:
+        """penalize() for async callers, without blocking the event loop on Redis"""
+        key, _, rate, _ = self._reservations(model, api_key, 0)[0]
+        await self.backend.adrain(key, -seconds * rate)
+        logger.warning(f"⚠️  429 from {model}; pausing key {key_id(api_key)} for ~{seconds:.0f}s")
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "backend": type(self.backend).__name__,
+            "models": {
+                model: {
+                    "quota": self.quota(model),
+                    "requests": count,
+                    "avg_wait_s": round(self.waits.get(model, 0.0) / count, 2),
+                }
+                for model, count in self.requests.items()
+            },
+        }
+
+
+class RateLimitCallbackHandler(BaseCallbackHandler):
+    """Acquire quota before every LangChain call to a Gemini chat model"""
+
+    raise_error = True
+
+    def __init__(self, limiter: "RateLimiter", model: str, api_key: Optional[str]):
+        self.limiter = limiter
+        self.model = model
+        self.api_key = api_key
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], **kwargs) -> None:
+        self.limiter.acquire_sync(self.model, self.api_key, sum(estimate_tokens(p) for p in prompts))
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[List[Any]], **kwargs) -> None:
+        text = "".join(str(m.content) for batch in messages for m in batch)
+        self.limiter.acquire_sync(self.model, self.api_key, estimate_tokens(text))
+
+
+_limiter: Optional[RateLimiter] = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Return the process-wide rate limiter"""
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                backend = RedisBucketBackend() if RATE_LIMIT_BACKEND == "redis" else LocalBucketBackend()
+                _limiter = RateLimiter(backend)
+    return _limiter
+
+
+__all__ = [
+    "RateLimiter",
+    "RateLimitExceeded",
+    "RateLimitCallbackHandler",
+    "get_rate_limiter",
+    "estimate_tokens",
+    "is_quota_error",
+    "is_rate_limit_error",
+    "key_id",
+    "RATE_LIMIT_PENALTY",
+]
@@ -0,0 +1,76 @@
+import os
+import re
+import logging
+from typing import Dict, Iterable, List
+
+logger = logging.getLogger(__name__)
+
+TRANSCRIPT_SCAN_COUNT = int(os.getenv("TRANSCRIPT_SCAN_COUNT", "1000"))
+TRANSCRIPT_MGET_BATCH = int(os.getenv("TRANSCRIPT_MGET_BATCH", "100"))
+
+
+def transcript_key(user_id: str, video_id: str) -> str:
+    """Redis key the Node Backend caches a transcript under"""
+    return f"transcript:{user_id}:{video_id}"
+
+
+def _escape_pattern(value: str) -> str:
+    return re.sub(r"([*?\[\]\\])", r"\\\1", value)
+
+
+def _batches(items: List[str], size: int) -> Iterable[List[str]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class TranscriptStore:
+    """
+    Loads cached transcripts from a redis.asyncio client without KEYS: video IDs come
+    from an incremental SCAN over the Backend's transcript keys; bodies are fetched
+    with pipelined MGET in bounded batches.
+    """
+
+    def __init__(self, client, scan_count: int = TRANSCRIPT_SCAN_COUNT, batch_size: int = TRANSCRIPT_MGET_BATCH):
+        self.client = client
+        self.scan_count = scan_count
+        self.batch_size = batch_size
+
+    async def list_video_ids(self, user_id: str) -> List[str]:
+        """Video IDs with a cached transcript for this user"""
+        prefix = transcript_key(user_id, "")
+        pattern = _escape_pattern(prefix) + "*"
+        keys = [key async for key in self.client.scan_iter(match=pattern, count=self.scan_count)]
+        return sorted({key[len(prefix):] for key in keys})
+
+    async def fetch(self, user_id: str, video_ids: List[str]) -> Dict[str, str]:
+        """Transcript bodies by video ID; expired or empty ones are left out"""
+        if not video_ids:
+            return {}
+
+        pipe = self.client.pipeline(transaction=False)
+        batches = list(_batches(video_ids, self.batch_size))
+        for batch in batches:
+            pipe.mget([transcript_key(user_id, video_id) for video_id in batch])
+        results = await pipe.execute()
+
+        transcripts = {}
+        for batch, values in zip(batches, results):
+            for video_id, value in zip(batch, values):
+                if value:
+                    transcripts[video_id] = value
+        return transcripts
+
+    async def delete_user(self, user_id: str) -> int:
+        """Delete every cached transcript for the user with non-blocking UNLINK"""
+        keys = [transcript_key(user_id, video_id) for video_id in await self.list_video_ids(user_id)]
+        pipe = self.client.pipeline(transaction=False)
+        for batch in _batches(keys, self.batch_size):
+            pipe.unlink(*batch)
+        results = await pipe.execute()
+        return int(sum(results))
+
+
+__all__ = [
+    "TranscriptStore",
+    "transcript_key",
+]
@@ -0,0 +1,250 @@
+import os
+import re
+import json
+import uuid
+import shutil
+import hashlib
+import threading
+import logging
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+from langchain.schema import Document
+from langchain_core.embeddings import Embeddings
+from langchain_community.vectorstores import FAISS
+from services.embeddings import get_embeddings
+
+logger = logging.getLogger(__name__)
+
+PERSONA_INDEX_DIR = os.getenv("PERSONA_INDEX_DIR", "vectorDBs/personas")
+USER_INDEX_CACHE_SIZE = int(os.getenv("USER_INDEX_CACHE_SIZE", "32"))
+
+_indexes: Dict[str, FAISS] = {}
+_indexes_lock = threading.Lock()
+
+
+def from_texts(
+    texts: List[str],
+    metadatas: Optional[List[dict]] = None,
+    embedding: Optional[Embeddings] = None
+) -> FAISS:
+    """Build an in-memory FAISS index with the shared embedding model"""
+    return FAISS.from_texts(texts, embedding or get_embeddings(), metadatas=metadatas)
+
+
+def from_documents(docs: List[Document]) -> FAISS:
+    """Build an in-memory FAISS index from documents with the shared embedding model"""
+    return FAISS.from_documents(docs, get_embeddings())
+
+
+def load_index(path: str) -> FAISS:
+    """Load a saved FAISS index once per process and reuse it"""
+    key = os.path.abspath(path)
+    with _indexes_lock:
+        if key not in _indexes:
+            if not os.path.exists(key):
+                raise FileNotFoundError(f"FAISS index not found at {path}")
+            _indexes[key] = FAISS.load_local(
+                key,
+                embeddings=get_embeddings(),
+                allow_dangerous_deserialization=True
+            )
+            logger.info(f"Loaded FAISS index from {path}")
+        return _indexes[key]
+
+
+def transcript_hash(transcript: str) -> str:
+    return hashlib.sha256(transcript.encode("utf-8")).hexdigest()
+
+
+class UserIndexStore:
+    """
+    Per-user FAISS transcript indexes, persisted to disk and updated incrementally.
+    Updates are copy-on-write: an index handed out by sync() is never modified, so
+    retrievers can keep querying it while a newer version is built. On disk every
+    version is a complete directory (index + manifest); the CURRENT file names the
+    live one and is switched with a single atomic rename.
+    """
+
+    MANIFEST = "manifest.json"
+    CURRENT = "CURRENT"
+
+    def __init__(
+        self,
+        split_fn: Callable[[str, str], List[str]],
+        embedding: Optional[Embeddings] = None,
+        root: str = PERSONA_INDEX_DIR,
+        cache_size: int = USER_INDEX_CACHE_SIZE
+    ):
+        self.split_fn = split_fn
+        self.embedding = embedding or get_embeddings()
+        self.root = root
+        self.cache_size = cache_size
+        # userId -> (index or None, {videoId: {"hash": transcript hash, "ids": [docstore ids]}})
+        self._loaded: "OrderedDict[str, Tuple[Optional[FAISS], Dict[str, dict]]]" = OrderedDict()
+        self._locks: Dict[str, threading.Lock] = {}
+        self._guard = threading.Lock()
+
+    def _path(self, user_id: str) -> str:
+        safe_id = re.sub(r"[^A-Za-z0-9_-]", "_", user_id)
+        return os.path.join(self.root, safe_id)
+
+    def _lock(self, user_id: str) -> threading.Lock:
+        with self._guard:
+            return self._locks.setdefault(user_id, threading.Lock())
+
+    def _current_dir(self, user_id: str) -> Optional[str]:
+        """Directory of the live version, or None if the user has no saved index"""
+        path = self._path(user_id)
+        current_path = os.path.join(path, self.CURRENT)
+        if os.path.exists(current_path):
+            with open(current_path, "r") as f:
+                return os.path.join(path, f.read().strip())
+        # Indexes saved before versioning keep their files directly in the user directory
+        if os.path.exists(os.path.join(path, self.MANIFEST)):
+            return path
+        return None
+
+    def _load(self, user_id: str) -> Tuple[Optional[FAISS], Dict[str, dict]]:
+        """Return the user's index and manifest, reading them from disk on first use"""
+        with self._guard:
+            if user_id in self._loaded:
+                self._loaded.move_to_end(user_id)
+                return self._loaded[user_id]
+
+        directory = self._current_dir(user_id)
+        index, videos = None, {}
+        if directory is not None:
+            with open(os.path.join(directory, self.MANIFEST), "r") as f:
+                videos = {
+                    # Old manifests list chunk ids only; a missing hash re-embeds the video once
+                    video_id: entry if isinstance(entry, dict) else {"hash": None, "ids": entry}
+                    for video_id, entry in json.load(f).get("videos", {}).items()
+                }
+            index = FAISS.load_local(directory, embeddings=self.embedding, allow_dangerous_deserialization=True)
+            logger.info(f"Loaded FAISS index for user {user_id} ({len(videos)} videos)")
+
+        self._remember(user_id, index, videos)
+        return index, videos
+
+    def _remember(self, user_id: str, index: Optional[FAISS], videos: Dict[str, dict]) -> None:
+        with self._guard:
+            self._loaded[user_id] = (index, videos)
+            self._loaded.move_to_end(user_id)
+            while len(self._loaded) > self.cache_size:
+                self._loaded.popitem(last=False)
+
+    def _save(self, user_id: str, index: FAISS, videos: Dict[str, dict]) -> None:
+        """
+        Write a complete new version, then point CURRENT at it. A crash at any point
+        leaves CURRENT on the previous version, whose index and manifest still match.
+        """
+        path = self._path(user_id)
+        version = uuid.uuid4().hex
+        directory = os.path.join(path, version)
+        os.makedirs(directory)
+        index.save_local(directory)
+        with open(os.path.join(directory, self.MANIFEST), "w") as f:
+            json.dump({"videos": videos}, f)
+
+        tmp_path = os.path.join(path, self.CURRENT + ".tmp")
+        with open(tmp_path, "w") as f:
+            f.write(version)
+        os.replace(tmp_path, os.path.join(path, self.CURRENT))
+
+        # Older versions, unfinished versions from a crash and pre-versioning files
+        for name in os.listdir(path):
+            if name not in (version, self.CURRENT):
+                target = os.path.join(path, name)
+                if os.path.isdir(target):
+                    shutil.rmtree(target, ignore_errors=True)
+                else:
+                    os.remove(target)
+
+    def indexed_videos(self, user_id: str) -> Set[str]:
+        """Video IDs already embedded in the user's index"""
+        with self._lock(user_id):
+            return set(self._load(user_id)[1])
+
+    def sync(self, user_id: str, current_ids: Iterable[str], transcripts: Dict[str, str]) -> Optional[FAISS]:
+        """
+        Bring the user's index in line with their transcripts.
+        Videos missing from current_ids are removed; transcripts that are new or whose
+        text changed since they were embedded are split and (re-)embedded.
+        """
+        current_ids = set(current_ids) | set(transcripts)
+        with self._lock(user_id):
+            return self._sync(user_id, current_ids, transcripts)
+
+    def _sync(self, user_id: str, current_ids: Set[str], transcripts: Dict[str, str]) -> Optional[FAISS]:
+        index, videos = self._load(user_id)
+        videos = dict(videos)
+
+        removed = [video_id for video_id in videos if video_id not in current_ids]
+        stale_ids = [doc_id for video_id in removed for doc_id in videos.pop(video_id)["ids"]]
+
+        texts, metadatas, ids = [], [], []
+        changed = 0
+        for video_id in sorted(transcripts):
+            digest = transcript_hash(transcripts[video_id])
+            entry = videos.get(video_id)
+            if entry is not None:
+                if entry["hash"] == digest:
+                    continue
+                stale_ids.extend(entry["ids"])
+                changed += 1
+            chunks = self.split_fn(video_id, transcripts[video_id])
+            chunk_ids = [uuid.uuid4().hex for _ in chunks]
+            videos[video_id] = {"hash": digest, "ids": chunk_ids}
+            texts.extend(chunks)
+            metadatas.extend({"videoId": video_id} for _ in chunks)
+            ids.extend(chunk_ids)
+
+        if (texts or stale_ids) and index is not None:
+            # Copy-on-write: retrievers may still be searching the published index
+            index = FAISS.deserialize_from_bytes(
+                index.serialize_to_bytes(), self.embedding, allow_dangerous_deserialization=True
+            )
+            if stale_ids:
+                index.delete(stale_ids)
+
+        if texts:
+            vectors = self.embedding.embed_documents(texts)
+            if index is None:
+                index = FAISS.from_embeddings(list(zip(texts, vectors)), self.embedding, metadatas=metadatas, ids=ids)
+            else:
+                index.add_embeddings(list(zip(texts, vectors)), metadatas=metadatas, ids=ids)
+
+        if not videos:
+            self._drop(user_id)
+            return None
+
+        if texts or stale_ids:
+            self._save(user_id, index, videos)
+            logger.info(
+                f"Updated FAISS index for user {user_id}: +{len(texts)} chunks, "
+                f"{changed} changed, -{len(removed)} videos, {len(videos)} videos total"
+            )
+        self._remember(user_id, index, videos)
+        return index
+
+    def _drop(self, user_id: str) -> bool:
+        with self._guard:
+            self._loaded.pop(user_id, None)
+        path = self._path(user_id)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+            return True
+        return False
+
+    def delete(self, user_id: str) -> bool:
+        """Remove the user's index from memory and disk"""
+        with self._lock(user_id):
+            return self._drop(user_id)
+
+
+__all__ = [
+    "from_texts",
+    "from_documents",
+    "load_index",
+    "UserIndexStore",
+]
@@ -0,0 +1,76 @@
+"""
+Behaviour checks for services/patcher.py (paragraph edits used by the cre8echo refine loop)
+Runs offline: python test_patcher.py
+"""
+
+from types import SimpleNamespace
+from services.patcher import split_sections, number_sections, apply_edits
+
+SCRIPT = "Hook line.\n\nSecond paragraph.\n\nThird paragraph.\n\nOutro."
+
+def edit(id, op="replace", text=None):
+    return SimpleNamespace(id=id, op=op, text=text)
+
+def test_split_sections():
+    """Blank lines split paragraphs; scripts without them split into lines"""
+    sections, separator = split_sections(SCRIPT)
+    assert sections == ["Hook line.", "Second paragraph.", "Third paragraph.", "Outro."]
+    assert separator == "\n\n"
+    sections, separator = split_sections("  one\ntwo \n\n")
+    assert sections == ["one", "two"] and separator == "\n"
+    assert number_sections(["a", "b"]) == "[P1] a\n\n[P2] b"
+    return True
+
+def test_ids_follow_original_numbering():
+    """A delete or insert earlier in the list does not shift the IDs of later edits"""
+    sections, _ = split_sections(SCRIPT)
+    patched, applied, skipped = apply_edits(sections, [
+        edit("P1", "delete"),
+        edit("P1", "insert_after", "New opener."),
+        edit("P3", "replace", "Third, rewritten."),
+    ])
+    assert patched == ["New opener.", "Second paragraph.", "Third, rewritten.", "Outro."]
+    assert (applied, skipped) == (3, 0)
+    return True
+
+def test_tags_and_id_spelling():
+    """Echoed [Pn] tags are stripped from text; IDs match with brackets, spaces or lower case"""
+    sections, _ = split_sections(SCRIPT)
+    patched, applied, _ = apply_edits(sections, [
+        edit(" [p2] ", "replace", "[P2] Second, tightened."),
+        edit("P4", "insert_after", "[p9]  Subscribe!"),
+    ])
+    assert patched == ["Hook line.", "Second, tightened.", "Third paragraph.", "Outro.", "Subscribe!"]
+    assert applied == 2
+    return True
+
+def test_invalid_edits_are_skipped():
+    """Unknown IDs and ops, and replace/insert without text, leave the script unchanged"""
+    sections, _ = split_sections(SCRIPT)
+    patched, applied, skipped = apply_edits(sections, [
+        edit("P9", "replace", "nope"),
+        edit("P1", "rewrite", "nope"),
+        edit("P2", "replace", "[P2]  "),
+        edit("P3", "insert_after", None),
+    ])
+    assert patched == sections and patched is not sections
+    assert (applied, skipped) == (0, 4)
+    return True
+
+def main():
+    """Run all tests"""
+    results = {
+        "Split sections": test_split_sections(),
+        "Original numbering": test_ids_follow_original_numbering(),
+        "Tags and IDs": test_tags_and_id_spelling(),
+        "Invalid edits": test_invalid_edits_are_skipped(),
+    }
+    for test_name, result in results.items():
+        status = "✅ PASSED" if result else "❌ FAILED"
+        print(f"{test_name:20s}: {status}")
+    return all(results.values())
+
+if __name__ == "__main__":
+    import sys
+    success = main()
+    sys.exit(0 if success else 1)